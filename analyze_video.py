@@ -0,0 +1,212 @@
+"""Headless offline analysis of a recorded video.
+
+Decodes a video file, samples frames by time, matches them against the POIs
+around the recording position in batches and writes one result per sampled
+frame (JSONL, or Parquet when pandas/pyarrow are installed). Optionally
+renders an annotated copy of the video. With --profile, per-stage timings
+are logged at the end; --trace also writes a Chrome trace timeline.
+
+    python analyze_video.py data/video_chateau.mp4 --lat 44.5216 --lon 1.9397 \\
+        --sample-fps 2 --batch-size 16 --output results.jsonl --annotate annotated.mp4
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera_stream import CameraStream
+from overlay import draw_overlay
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+
+def sample_frames(src: str, sample_fps: float,
+                  frame_size: Optional[int] = None) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """Yield (frame_index, timestamp_s, frame) every 1/sample_fps seconds of video time.
+
+    Frames in between are only grabbed, not decoded into images, and long
+    gaps are crossed with a seek (see `CameraStream`). With `frame_size`,
+    frames are downscaled at decode so their shorter side is that many pixels.
+    """
+    stream = CameraStream(src, width=None, height=None, display_fps=sample_fps if sample_fps > 0 else None,
+                          inference_size=frame_size)
+    for packet in stream.packets():
+        yield packet["index"], packet["timestamp"], packet["inference"]
+
+
+def _record(index: int, t: float, match: Optional[Dict]) -> Dict:
+    rec = {"frame_index": index, "timestamp": round(t, 3), "poi": None, "wikidata": None,
+           "similarity": None, "margin": None, "top_k": []}
+    if match:
+        poi = match["poi"]
+        rec.update({
+            "poi": poi.get("name"),
+            "wikidata": poi.get("tags", {}).get("wikidata"),
+            "similarity": match["similarity"],
+            "margin": match.get("margin"),
+            "top_k": [{"poi": m["poi"].get("name"), "similarity": m["similarity"]}
+                      for m in match.get("top_k", [match])],
+        })
+    return rec
+
+
+def write_results(records: List[Dict], path: str):
+    """Write records as JSONL, or as Parquet if `path` ends with .parquet."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs pandas and pyarrow installed") from e
+        rows = [dict(r, top_k=json.dumps(r["top_k"], ensure_ascii=False)) for r in records]
+        pd.DataFrame(rows).to_parquet(path, index=False)
+        return
+    with open(path, "w", encoding="utf8") as f:
+        for r in records:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+
+def write_annotated_video(src: str, records: List[Dict], out_path: str, sim_threshold: float = 0.5):
+    """Re-decode `src` and draw the latest result at each frame into `out_path`."""
+    cap = cv2.VideoCapture(src)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    writer = None
+    by_index = sorted(records, key=lambda r: r["frame_index"])
+    pos, current = 0, None
+    index = -1
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            index += 1
+            while pos < len(by_index) and by_index[pos]["frame_index"] <= index:
+                current = by_index[pos]
+                pos += 1
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+            if current is None or current["poi"] is None:
+                text, score = "No match", None
+            else:
+                label = "" if current["similarity"] >= sim_threshold else " (low confidence)"
+                text, score = f"{current['poi']}{label}", current["similarity"]
+            writer.write(draw_overlay(frame, text, score=score))
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+
+
+def analyze_video(
+    src: str,
+    engine,
+    sample_fps: float = 2.0,
+    batch_size: int = 16,
+    top_k: int = 5,
+    output: Optional[str] = None,
+    annotate: Optional[str] = None,
+    sim_threshold: float = 0.5,
+    frame_size: Optional[int] = None,
+) -> Dict:
+    """Match sampled frames of `src` with a prepared `MatchEngine`.
+
+    Returns a summary with the per-frame records and throughput figures.
+    """
+    records: List[Dict] = []
+    batch: List[Tuple[int, float, np.ndarray]] = []
+    infer_seconds = 0.0
+
+    def flush():
+        nonlocal infer_seconds
+        t0 = time.perf_counter()
+        matches = engine.match_frames([f for _, _, f in batch], k=top_k)
+        infer_seconds += time.perf_counter() - t0
+        records.extend(_record(i, t, m) for (i, t, _), m in zip(batch, matches))
+        batch.clear()
+
+    start = time.perf_counter()
+    for index, t, frame in sample_frames(src, sample_fps, frame_size=frame_size):
+        batch.append((index, t, frame))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    elapsed = time.perf_counter() - start
+
+    if output:
+        write_results(records, output)
+    if annotate:
+        write_annotated_video(src, records, annotate, sim_threshold=sim_threshold)
+
+    summary = {
+        "video": src,
+        "frames_analyzed": len(records),
+        "seconds": elapsed,
+        "inference_seconds": infer_seconds,
+        "frames_per_second": len(records) / elapsed if elapsed > 0 else 0.0,
+        "records": records,
+    }
+    logger.info("Analyzed %d frames of %s in %.1fs (%.2f frames/s, %.1fs in inference)",
+                len(records), src, elapsed, summary["frames_per_second"], infer_seconds)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless monument recognition over a video file")
+    parser.add_argument("video")
+    parser.add_argument("--lat", type=float, required=True)
+    parser.add_argument("--lon", type=float, required=True)
+    parser.add_argument("--radius-km", type=float, default=1.0)
+    parser.add_argument("--heading", type=float, default=None,
+                        help="camera compass bearing (degrees): only POIs in view are matched")
+    parser.add_argument("--fov", type=float, default=60.0, help="horizontal field of view (degrees)")
+    parser.add_argument("--max-pois", type=int, default=100)
+    parser.add_argument("--sample-fps", type=float, default=2.0, help="frames analyzed per second of video")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--frame-size", type=int, default=None,
+                        help="downscale frames at decode to this shorter side (e.g. 256 for 4K footage)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--sim-threshold", type=float, default=0.5)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--backend", default=None, help="CLIP backend, e.g. open_clip_int8 for faster CPU inference")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--output", default="results.jsonl", help=".jsonl or .parquet")
+    parser.add_argument("--annotate", default=None, help="optional annotated output video (.mp4)")
+    parser.add_argument("--pack", default=None, help="region pack (build_region_pack.py) to read POIs from offline")
+    parser.add_argument("--profile", action="store_true", help="log per-stage timings at the end")
+    parser.add_argument("--trace", default=None, help="write a Chrome trace timeline (JSON) to this path")
+    parser.add_argument("--log-level", default=None, help="DEBUG, INFO, WARNING, ... (default: INFO)")
+    args = parser.parse_args(argv)
+
+    instrument.configure_logging(args.log_level)
+    if args.profile or args.trace:
+        instrument.enable(trace=bool(args.trace))
+
+    from geo.poi_retrieval import get_nearby_pois
+    from vision.match_engine import MatchEngine
+
+    # load the model while POIs are retrieved
+    engine = MatchEngine(device=args.device, alpha=0.9, max_radius_km=args.radius_km, warm_up=True,
+                         clip_backend=args.backend, threads=args.threads, fov_deg=args.fov)
+    engine.heading = args.heading
+    pois = get_nearby_pois(args.lat, args.lon, radius_km=args.radius_km, max_results=args.max_pois, pack=args.pack)
+    engine.prepare_references(pois, position=(args.lat, args.lon))
+    analyze_video(args.video, engine, sample_fps=args.sample_fps, batch_size=args.batch_size,
+                  top_k=args.top_k, output=args.output, annotate=args.annotate,
+                  sim_threshold=args.sim_threshold, frame_size=args.frame_size)
+    if instrument.enabled:
+        logger.info("Per-stage timings:\n%s", instrument.format_table())
+    if args.trace:
+        instrument.write_trace(args.trace)
+        logger.info("Trace written to %s (open in chrome://tracing or ui.perfetto.dev)", args.trace)
+
+
+if __name__ == "__main__":
+    main()
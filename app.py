@@ -1,63 +1,150 @@
-import argparse
-import os
 import time
-from typing import Tuple
+
+_STARTED = time.perf_counter()
+
+import logging
 
 import cv2
 
 from camera_stream import CameraStream
-from data_fetcher import fetch_info
-from geo_localization import get_mock_gps
+from data_fetcher import default_info_service
+from inference_worker import InferenceWorker
 from overlay import draw_overlay
+from stream_server import StreamServer, match_event
 
 from geo.poi_retrieval import get_nearby_pois
+from vision.change_detector import FrameChangeGate
 from vision.match_engine import MatchEngine
+from vision.tracker import SEARCHING, TRACKING, TrackingStage
+from utils import instrument
+from utils.startup import StartupReport
 
+_IMPORTED = time.perf_counter()
 
+logger = logging.getLogger("app")
 
 
-def main(src,gps,radius_km=1,max_pois=100,sim_threshold=0.5,sample_fps=500):
-    # get mock or device GPS (mock by default)
 
-    print("Retrieving POIs near", gps)
-    pois = get_nearby_pois(gps[0], gps[1], radius_km=radius_km, max_results=max_pois)
-    print(f"Found {len(pois)} POIs (using radius {radius_km} km)")
 
-    # prepare match engine
-    engine = MatchEngine(device="cpu", alpha=0.9, max_radius_km=radius_km)
-    image_cache = os.path.join(os.path.dirname(__file__), "data", "references")
-    engine.prepare_references(pois)
+def main(src,gps,radius_km=1,max_pois=100,sim_threshold=0.5,sample_fps=5.0,serve_port=None,
+         profile=False,trace_path=None,pack=None,heading=None,display_size=(1280,720),inference_size=256):
+    # per-stage timings (HUD + end-of-run table) and optional Chrome trace
+    if profile or trace_path:
+        instrument.enable(trace=bool(trace_path))
+    # get mock or device GPS (mock by default)
+    report = StartupReport(origin=_STARTED)
+    report.add("imports", _STARTED, _IMPORTED - _STARTED)
+
+    # the CLIP model loads in the background while POIs are retrieved
+    engine = MatchEngine(device="cpu", alpha=0.9, max_radius_km=radius_km, warm_up=True)
+    # camera compass bearing: only POIs in the field of view are scored
+    engine.heading = heading
+
+    logger.info("Retrieving POIs near %s", gps)
+    with report.phase("poi retrieval"):
+        # a region pack (build_region_pack.py) answers offline, with embeddings
+        pois = get_nearby_pois(gps[0], gps[1], radius_km=radius_km, max_results=max_pois, pack=pack)
+    logger.info("Found %d POIs (using radius %s km)", len(pois), radius_km)
+
+    # prepare match engine (waits for the model if it is still loading)
+    with report.phase("reference preparation"):
+        engine.prepare_references(pois, position=gps)
+    report.add("model load (background)", engine.clip.load_started, engine.clip.load_seconds)
+
+    # descriptions for the whole reference set are fetched in the background;
+    # lookups at match time then only read the local/cached entries
+    info = default_info_service()
+    info.prefetch(p.get("name") for p in engine.refs)
 
-    last_match = None
-    sample_every = max(1, int(1.0 / sample_fps)) if sample_fps > 0 else 30
     counter = 0
-
-    with CameraStream(src=src) as stream:
-        for frame in stream.frames():
+    # skip inference while the scene is unchanged (reuses the previous match)
+    gate = FrameChangeGate()
+    # once a monument is confidently matched, follow it with a tracker and
+    # only go back to matching when the track is lost
+    tracking = TrackingStage(min_similarity=sim_threshold)
+    last_result, last_result_id = None, None
+    # display frame of the pending inference: the tracker locks on the frame
+    # the match was computed from, not on the (later) current frame
+    submitted_id, submitted_frame = None, None
+    # optional localhost server pushing results and annotated frames to clients
+    server = StreamServer(port=serve_port).start() if serve_port else None
+    stream_opened = time.perf_counter()
+    # frames are composed into one reused display buffer
+    canvas = None
+    # profiling HUD text, refreshed twice a second
+    hud, hud_refreshed = [], 0.0
+
+    # inference and info lookup run on a worker thread; the loop below only
+    # renders the latest completed result. The stream decodes frames once at
+    # display size and marks `sample_fps` frames per second (of video time)
+    # for inference, downscaled again to what CLIP needs.
+    stream = CameraStream(src=src, width=display_size[0], height=display_size[1], threaded=True,
+                          inference_fps=sample_fps if sample_fps > 0 else None, inference_size=inference_size)
+    with InferenceWorker(engine, info_fn=info.lookup, sim_threshold=sim_threshold) as worker:
+        for packet in stream.packets():
+            frame, inference = packet["frame"], packet["inference"]
             counter += 1
-            if counter % sample_every == 0:
-                match = engine.match_frame(frame)
-                print(f"Match: {match}")
-                if match and match.get("similarity", 0) >= sim_threshold:
-                    info = fetch_info(match["poi"]["name"])
-                    display_text = f"{info.get('name')} - {info.get('description')[:200]}"
-                elif match:
-                    display_text = f"{match.get('name')} (low confidence)"
-                else:
-                    display_text = "No match"
-                last_match = (display_text, match)
+            was_tracking = tracking.state == TRACKING
+            with instrument.span("tracking"):
+                track = tracking.update(frame)
+            if was_tracking and track["needs_match"]:
+                # target lost: re-match right away even if the scene looks similar
+                gate.reset()
+
+            if track["needs_match"] and inference is not None and not worker.busy and gate.should_infer(inference):
+                worker.submit(inference.copy() if inference is frame else inference, frame_id=counter)
+                submitted_id, submitted_frame = counter, frame
+
+            result = worker.latest()
+            # a new object is either a new match or the same match with its
+            # description filled in after the prefetch caught up
+            if result is not None and result is not last_result:
+                last_result = result
+                if result["frame_id"] != last_result_id:
+                    last_result_id = result["frame_id"]
+                    if tracking.state == SEARCHING and result["frame_id"] == submitted_id:
+                        tracking.lock(submitted_frame, result["match"])
+                        submitted_frame = None
+                if server is not None:
+                    server.publish_event(match_event(result, {"state": tracking.state, "bbox": tracking.bbox}))
+            if result is not None:
+                display_text, match = result["display_text"], result["match"]
             else:
-                display_text, match = last_match if last_match else ("No match yet", None)
+                display_text, match = "No match yet", None
 
-            out = draw_overlay(frame, display_text, score=match.get("score") if match else None)
+            if instrument.enabled and time.perf_counter() - hud_refreshed > 0.5:
+                hud, hud_refreshed = instrument.hud_lines(), time.perf_counter()
+            if canvas is None or canvas.shape != frame.shape:
+                canvas = frame.copy()
+            out = draw_overlay(frame, display_text, score=match.get("similarity") if match else None,
+                               bbox=tracking.bbox, out=canvas, hud=hud)
 
+            if server is not None:
+                server.publish_frame(out, frame_id=counter)
             cv2.imshow("AR Monument Recognition", out)
+            if counter == 1:
+                report.add("camera + first frame", stream_opened, time.perf_counter() - stream_opened)
+                report.print()
             key = cv2.waitKey(1) & 0xFF
             if key == ord("q"):
                 break
 
+        logger.info("Inference: %s", worker.stats())
+        logger.info("Change gate: %s", gate.stats())
+        logger.info("Tracking: %s", tracking.stats())
+        logger.info("Capture: %s", stream.stats())
+        if server is not None:
+            logger.info("Streaming: %s", server.stats())
+            server.stop()
+
     cv2.destroyAllWindows()
+    if instrument.enabled:
+        logger.info("Per-stage timings:\n%s", instrument.format_table())
+    if trace_path:
+        instrument.write_trace(trace_path)
+        logger.info("Trace written to %s", trace_path)
 
 
 if __name__ == "__main__":
+    instrument.configure_logging()
     main('data/video_chateau.mp4',(44.5216141, 1.9397062),max_pois=50)
@@ -0,0 +1,385 @@
+"""Batch analysis of many recorded videos across CPU cores.
+
+Each job is a (video, lat, lon) triple. Jobs are grouped by area (a grid
+cell of `area_deg` degrees): POIs are retrieved and reference embeddings
+are computed once per area in the parent process, which is the only writer
+of the embedding cache. Worker processes load the model once at start-up,
+open the cache read-only and keep their prepared reference set between
+jobs: moving to the next video only filters it to that video's position,
+and references already loaded are never encoded again.
+
+Failed jobs (including a crashed worker) are retried up to `retries` times
+without stopping the others. Per-video results are written under
+`<out_dir>/videos/` and merged into `<out_dir>/results.jsonl`, with a
+`summary.json` describing every job.
+
+    python batch_runner.py manifest.csv --out-dir batch_out --workers 4
+    python batch_runner.py videos/ --lat 44.5216 --lon 1.9397 --workers 4
+
+A manifest is a CSV with `video,lat,lon` columns or a JSONL file with the
+same keys. For a directory, each video may carry a `<name>.json` sidecar
+with `lat`/`lon`; otherwise --lat/--lon are used. An optional `heading`
+(camera compass bearing, degrees) restricts matching to the POIs in view. With --profile, workers
+collect per-stage timings and each job result carries its own breakdown.
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm")
+
+# ------------------------------------------------------------------- jobs
+
+
+def _heading(meta: Dict) -> Optional[float]:
+    value = meta.get("heading")
+    return None if value in (None, "") else float(value)
+
+
+def load_jobs(source: str, lat: Optional[float] = None, lon: Optional[float] = None) -> List[Dict]:
+    """Read jobs from a CSV/JSONL manifest or a directory of videos."""
+    jobs = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            path = os.path.join(source, name)
+            sidecar = os.path.splitext(path)[0] + ".json"
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf8") as f:
+                    meta = json.load(f)
+                jobs.append({"video": path, "lat": float(meta["lat"]), "lon": float(meta["lon"]),
+                             "heading": _heading(meta)})
+            elif lat is not None and lon is not None:
+                jobs.append({"video": path, "lat": lat, "lon": lon})
+            else:
+                logger.warning("Skipping %s: no GPS sidecar and no --lat/--lon", path)
+        return jobs
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, "r", encoding="utf8") as f:
+        if source.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        video = row["video"]
+        if not os.path.isabs(video):
+            video = os.path.join(base, video)
+        jobs.append({"video": video, "lat": float(row["lat"]), "lon": float(row["lon"]), "heading": _heading(row)})
+    return jobs
+
+
+def area_key(lat: float, lon: float, area_deg: float) -> Tuple[int, int]:
+    return (int(lat // area_deg), int(lon // area_deg))
+
+
+def _job_name(video: str, used: Dict[str, int]) -> str:
+    stem = os.path.splitext(os.path.basename(video))[0]
+    n = used.get(stem, 0)
+    used[stem] = n + 1
+    return stem if n == 0 else f"{stem}_{n}"
+
+
+# ---------------------------------------------------------------- workers
+
+_engine = None
+# names of jobs as workers start them (and initializer failures as
+# ("init_failed", message)), read by the driver after a crash
+_started = None
+# pool restarts in a row without any job starting before the pending jobs
+# are charged an attempt anyway (e.g. workers that keep dying at start-up)
+MAX_IDLE_POOL_BREAKS = 2
+
+
+def _init_worker(engine_kwargs: Dict, threads: int, log_level: int = logging.INFO, profile: bool = False,
+                 started=None):
+    """Process initializer: pin the thread count and load the model once."""
+    global _engine, _started
+    import torch
+
+    _started = started
+
+    # spawned workers start with unconfigured logging
+    instrument.configure_logging(log_level)
+    if profile:
+        instrument.enable()
+
+    torch.set_num_threads(threads)
+    try:
+        import cv2
+
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+    from vision.match_engine import MatchEngine
+
+    try:
+        _engine = MatchEngine(cache_read_only=True, **engine_kwargs)
+        _engine.clip.load()
+    except Exception as e:
+        if started is not None:
+            started.put(("init_failed", f"{type(e).__name__}: {e}"))
+        raise
+
+
+def _run_job(job: Dict, analysis: Dict) -> Dict:
+    """Analyze one video in a worker; errors are returned, not raised."""
+    from analyze_video import analyze_video
+
+    start = time.perf_counter()
+    if _started is not None:
+        # SimpleQueue writes synchronously: the name is out before a crash
+        _started.put(job["name"])
+    result = {"name": job["name"], "video": job["video"], "pid": os.getpid()}
+    if instrument.enabled:
+        instrument.reset()
+    try:
+        # incremental: only references new to this worker are encoded
+        _engine.prepare_references(job["pois"], position=(job["lat"], job["lon"]))
+        _engine.heading = job.get("heading")
+        summary = analyze_video(job["video"], _engine, output=job["output"], **analysis)
+        result.update({
+            "status": "ok",
+            "frames_analyzed": summary["frames_analyzed"],
+            "frames_per_second": summary["frames_per_second"],
+            "output": job["output"],
+        })
+    except Exception as e:
+        result.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+    result["seconds"] = time.perf_counter() - start
+    if instrument.enabled:
+        result["profile"] = instrument.snapshot()
+    return result
+
+
+# ---------------------------------------------------------------- driver
+
+
+def prepare_areas(jobs: List[Dict], area_deg: float, radius_km: float, max_pois: int,
+                  engine_kwargs: Dict, warm_cache: bool = True, pack: Optional[str] = None) -> Dict:
+    """Retrieve POIs once per area and optionally warm the shared embedding cache.
+
+    With a region `pack`, POIs inside it come with their embeddings and
+    nothing needs to be fetched or encoded for them.
+    """
+    from geo.poi_retrieval import get_nearby_pois
+    from utils.geoutils import haversine_km
+
+    engine = None
+    if warm_cache and engine_kwargs.get("cache_dir"):
+        from vision.match_engine import MatchEngine
+
+        # the model loads while POIs are retrieved
+        engine = MatchEngine(warm_up=True, **engine_kwargs)
+
+    areas: Dict[Tuple[int, int], List[Dict]] = {}
+    for job in jobs:
+        job["area"] = area_key(job["lat"], job["lon"], area_deg)
+        areas.setdefault(job["area"], []).append(job)
+
+    pois_by_area = {}
+    for key, members in areas.items():
+        # query around the centroid, widened to cover every job of the cell
+        lat = sum(j["lat"] for j in members) / len(members)
+        lon = sum(j["lon"] for j in members) / len(members)
+        spread = max(haversine_km(lat, lon, j["lat"], j["lon"]) for j in members)
+        pois_by_area[key] = get_nearby_pois(lat, lon, radius_km=radius_km + spread, max_results=max_pois, pack=pack)
+        logger.info("Area %s: %d video(s), %d POIs", key, len(members), len(pois_by_area[key]))
+
+    if engine is not None:
+        for key, pois in pois_by_area.items():
+            engine.prepare_references(pois)
+        if engine.cache is not None:
+            logger.info("Embedding cache warmed: %s", engine.cache.stats())
+    return pois_by_area
+
+
+def run_batch(
+    jobs: List[Dict],
+    out_dir: str,
+    workers: Optional[int] = None,
+    retries: int = 1,
+    area_deg: float = 0.02,
+    radius_km: float = 1.0,
+    max_pois: int = 100,
+    warm_cache: bool = True,
+    engine_kwargs: Optional[Dict] = None,
+    analysis: Optional[Dict] = None,
+    profile: bool = False,
+    pack: Optional[str] = None,
+) -> Dict:
+    """Analyze `jobs` on a pool of `workers` processes and merge the results.
+
+    Returns the batch summary (also written to `<out_dir>/summary.json`).
+    With `profile`, every job result includes an `instrument.snapshot()`.
+    """
+    workers = workers or max(1, (os.cpu_count() or 1) // 2)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    engine_kwargs = dict({"device": "cpu", "alpha": 0.9, "max_radius_km": radius_km}, **(engine_kwargs or {}))
+    engine_kwargs.setdefault("cache_dir", "data/embeddings")
+    analysis = dict({"sample_fps": 2.0, "batch_size": 16, "top_k": 5}, **(analysis or {}))
+
+    os.makedirs(os.path.join(out_dir, "videos"), exist_ok=True)
+    start = time.perf_counter()
+    pois_by_area = prepare_areas(jobs, area_deg, radius_km, max_pois, engine_kwargs, warm_cache, pack=pack)
+
+    used: Dict[str, int] = {}
+    for job in jobs:
+        job["name"] = _job_name(job["video"], used)
+        job["output"] = os.path.join(out_dir, "videos", job["name"] + ".jsonl")
+        job["pois"] = pois_by_area[job["area"]]
+    # same-area jobs are submitted back to back so workers mostly keep their references
+    pending = sorted(jobs, key=lambda j: (j["area"], j["name"]))
+    attempts = {j["name"]: 0 for j in jobs}
+    results: Dict[str, Dict] = {}
+    done = 0
+
+    logger.info("Running %d job(s) on %d worker(s) x %d thread(s)", len(jobs), workers, threads)
+    ctx = multiprocessing.get_context("spawn")
+    idle_breaks = 0
+    while pending:
+        retry: List[Dict] = []
+        started = ctx.SimpleQueue()
+        started_names = set()
+        init_error = None
+        broken = False
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                   initializer=_init_worker,
+                                   initargs=(engine_kwargs, threads, logging.getLogger().getEffectiveLevel(), profile,
+                                             started))
+        try:
+            futures = {pool.submit(_run_job, job, analysis): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    while not started.empty():
+                        item = started.get()
+                        if isinstance(item, tuple):
+                            init_error = item[1]
+                        else:
+                            started_names.add(item)
+                    if init_error is not None:
+                        error = f"worker failed to start: {init_error}"
+                    elif job["name"] not in started_names and idle_breaks < MAX_IDLE_POOL_BREAKS:
+                        # never ran: the crash was another job's, retry it for free
+                        retry.append(job)
+                        continue
+                    else:
+                        error = f"worker crashed: {e}"
+                    result = {"name": job["name"], "video": job["video"], "status": "failed", "error": error}
+                except Exception as e:
+                    result = {"name": job["name"], "video": job["video"], "status": "failed",
+                              "error": f"{type(e).__name__}: {e}"}
+                attempts[job["name"]] += 1
+                result["attempts"] = attempts[job["name"]]
+                if result["status"] != "ok" and attempts[job["name"]] <= retries:
+                    logger.warning("%s: %s (retrying)", job["name"], result["error"])
+                    retry.append(job)
+                    continue
+                results[job["name"]] = result
+                done += 1
+                if result["status"] == "ok":
+                    logger.info("[%d/%d] %s: %d frames in %.1fs (%.2f frames/s)", done, len(jobs), job["name"],
+                                result["frames_analyzed"], result["seconds"], result["frames_per_second"])
+                else:
+                    logger.error("[%d/%d] %s: FAILED after %d attempt(s): %s", done, len(jobs), job["name"],
+                                 result["attempts"], result["error"])
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            started.close()
+        idle_breaks = idle_breaks + 1 if broken and not started_names else 0
+        pending = retry
+
+    merged = os.path.join(out_dir, "results.jsonl")
+    frames = merge_results([results[j["name"]] for j in jobs], merged)
+    elapsed = time.perf_counter() - start
+    summary = {
+        "jobs": len(jobs),
+        "succeeded": sum(1 for r in results.values() if r["status"] == "ok"),
+        "failed": sum(1 for r in results.values() if r["status"] != "ok"),
+        "workers": workers,
+        "threads_per_worker": threads,
+        "frames_analyzed": frames,
+        "seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed > 0 else 0.0,
+        "results": merged,
+        "job_results": [results[j["name"]] for j in jobs],
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf8") as f:
+        json.dump(summary, f, indent=2)
+    logger.info("Batch done: %d/%d succeeded, %d frames in %.1fs (%.2f frames/s)",
+                summary["succeeded"], len(jobs), frames, elapsed, summary["frames_per_second"])
+    return summary
+
+
+def merge_results(job_results: List[Dict], path: str) -> int:
+    """Concatenate per-video JSONL files into `path`, tagging each record with its video."""
+    count = 0
+    with open(path, "w", encoding="utf8") as out:
+        for result in job_results:
+            if result["status"] != "ok":
+                continue
+            with open(result["output"], "r", encoding="utf8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    record = dict({"video": result["video"]}, **record)
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monument recognition over many videos in parallel")
+    parser.add_argument("source", help="CSV/JSONL manifest (video,lat,lon) or a directory of videos")
+    parser.add_argument("--lat", type=float, default=None, help="position for videos without a sidecar")
+    parser.add_argument("--lon", type=float, default=None)
+    parser.add_argument("--out-dir", default="batch_out")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: half the cores)")
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--area-deg", type=float, default=0.02, help="grid cell sharing one POI set")
+    parser.add_argument("--radius-km", type=float, default=1.0)
+    parser.add_argument("--max-pois", type=int, default=100)
+    parser.add_argument("--sample-fps", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--no-warm-cache", action="store_true",
+                        help="skip encoding references in the parent process")
+    parser.add_argument("--pack", default=None, help="region pack (build_region_pack.py) to read POIs from offline")
+    parser.add_argument("--profile", action="store_true", help="record per-stage timings for every job")
+    parser.add_argument("--log-level", default=None, help="DEBUG, INFO, WARNING, ... (default: INFO)")
+    args = parser.parse_args(argv)
+
+    instrument.configure_logging(args.log_level)
+
+    jobs = load_jobs(args.source, args.lat, args.lon)
+    if not jobs:
+        parser.error(f"no videos found in {args.source}")
+    run_batch(
+        jobs, args.out_dir, workers=args.workers, retries=args.retries, area_deg=args.area_deg,
+        radius_km=args.radius_km, max_pois=args.max_pois, warm_cache=not args.no_warm_cache,
+        analysis={"sample_fps": args.sample_fps, "batch_size": args.batch_size, "top_k": args.top_k},
+        profile=args.profile,
+        pack=args.pack,
+    )
+
+
+if __name__ == "__main__":
+    main()
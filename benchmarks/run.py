@@ -0,0 +1,333 @@
+"""Offline benchmark of the recognition pipeline.
+
+Runs every stage against synthetic inputs: a generated video, POI sets of
+configurable size, the deterministic `StubClip` backend (plus the real CLIP
+model when it can be loaded) and a local Overpass/Wikidata stand-in. Each
+stage reports latency percentiles, throughput and peak traced memory;
+results are saved as JSON and can be compared with a previous run.
+
+    python -m benchmarks.run --sizes 10 1000 100000 --output bench.json
+    python -m benchmarks.run --compare bench_before.json --output bench_after.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from benchmarks.stubs import StandInServer, StubClip
+from benchmarks.synthetic import DEFAULT_CENTER, make_video, synthetic_frame, synthetic_pois
+
+
+# ------------------------------------------------------------------ measuring
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the pipeline's progress output (prints and log records below ERROR) while measuring."""
+    logging.disable(logging.WARNING)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def summarize(samples: List[float], items_per_call: int = 1) -> Dict:
+    """Latency percentiles (ms) and throughput (items/s) of per-call durations in seconds."""
+    s = np.asarray(samples, dtype=np.float64) * 1000.0
+    total = s.sum() / 1000.0
+    return {
+        "calls": len(samples),
+        "mean_ms": float(s.mean()),
+        "p50_ms": float(np.percentile(s, 50)),
+        "p90_ms": float(np.percentile(s, 90)),
+        "p99_ms": float(np.percentile(s, 99)),
+        "max_ms": float(s.max()),
+        "throughput_per_s": len(samples) * items_per_call / total if total > 0 else 0.0,
+    }
+
+
+def peak_memory_mb(fn: Callable[[], object]) -> float:
+    """Peak memory traced by `tracemalloc` (Python and numpy allocations) during one call."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def measure(stage: str, fn: Callable[[], object], repeat: int, warmup: int = 1, items_per_call: int = 1,
+            memory: bool = True, **labels) -> Dict:
+    """Time `repeat` calls of `fn` (after `warmup`), then trace memory on one more call."""
+    samples = []
+    with quiet():
+        for _ in range(warmup):
+            fn()
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+        peak = peak_memory_mb(fn) if memory else None
+    result = {"stage": stage, **labels, **summarize(samples, items_per_call), "peak_mb": peak}
+    print(f"  {stage:<18} {json.dumps(labels):<40} p50 {result['p50_ms']:9.3f} ms  "
+          f"p99 {result['p99_ms']:9.3f} ms  {result['throughput_per_s']:10.1f}/s"
+          + (f"  peak {result['peak_mb']:.1f} MB" if memory else ""))
+    return result
+
+
+# --------------------------------------------------------------------- stages
+
+
+def load_real_clip():
+    """The real CLIP model if its weights can be loaded, else None."""
+    from vision.clip_model import ClipModel
+
+    try:
+        clip = ClipModel().load()
+    except Exception:
+        return None
+    return clip if clip.backend is not None else None
+
+
+def make_engine(clip, index: str = "exact"):
+    from vision.match_engine import MatchEngine
+
+    engine = MatchEngine(cache_dir=None, index=index)
+    engine.clip = clip
+    return engine
+
+
+def reference_pois(n: int, image_dir: Optional[str] = None) -> List[Dict]:
+    """Synthetic POIs with an `image_path`; files are written only when `image_dir` is given."""
+    from benchmarks.synthetic import reference_image
+
+    pois = synthetic_pois(n)
+    for p in pois:
+        if image_dir is None:
+            # StubClip encodes paths without reading them
+            p["image_path"] = f"synthetic://{p['id']}"
+        else:
+            p["image_path"] = os.path.join(image_dir, f"{p['id']}.jpg")
+            with open(p["image_path"], "wb") as f:
+                f.write(reference_image(p["name"]))
+    return pois
+
+
+def bench_encode(clip, frames: List[np.ndarray], repeat: int, backend: str) -> List[Dict]:
+    results = []
+    for batch in (1, 16):
+        items = frames[:batch]
+        results.append(measure("encode_images", lambda: clip.encode_images(items), repeat,
+                               items_per_call=batch, backend=backend, batch=batch))
+    return results
+
+
+def bench_matching(clip, sizes: List[int], frames: List[np.ndarray], repeat: int, backend: str,
+                   image_dir: Optional[str] = None) -> List[Dict]:
+    results = []
+    for n in sizes:
+        pois = reference_pois(n, image_dir)
+        # small sets get a warm-up call so one-time costs do not dominate
+        results.append(measure("prepare_refs", lambda: make_engine(clip).prepare_references(pois),
+                               repeat=1, warmup=int(n < 10_000), items_per_call=n, backend=backend, size=n))
+        for index in (["exact", "ivf"] if n >= 10_000 else ["exact"]):
+            engine = make_engine(clip, index)
+            with quiet():
+                engine.prepare_references(pois)
+            it = iter(range(10 ** 9))
+            results.append(measure("match_frame", lambda e=engine: e.match_frame(frames[next(it) % len(frames)]),
+                                   repeat, warmup=2, backend=backend, size=n, index=index))
+            # free the reference set before building the next (large) one
+            del engine
+    return results
+
+
+def bench_retrieval(area_pois: int, max_results: int, latency: float, workdir: str) -> List[Dict]:
+    import geo.poi_enrichment as enrichment
+    import geo.poi_retrieval as retrieval
+    from geo.tile_cache import OverpassTileCache
+
+    pois = synthetic_pois(area_pois, radius_km=2.0, seed=1)
+    saved = (retrieval.OVERPASS_URL, retrieval.REFERENCE_DIR, enrichment.WIKIDATA_API_URL,
+             enrichment.COMMONS_FILEPATH_URL, enrichment.WIKIPEDIA_SUMMARY_URL)
+    results = []
+    with StandInServer(pois, latency=latency) as server:
+        urls = server.urls()
+        retrieval.OVERPASS_URL = urls["overpass"]
+        retrieval.REFERENCE_DIR = os.path.join(workdir, "references")
+        enrichment.WIKIDATA_API_URL = urls["wikidata"]
+        enrichment.COMMONS_FILEPATH_URL = urls["commons"]
+        enrichment.WIKIPEDIA_SUMMARY_URL = urls["wikipedia"]
+        try:
+            tiles = OverpassTileCache(os.path.join(workdir, "tiles"))
+
+            def query():
+                return retrieval.get_nearby_pois(*DEFAULT_CENTER, radius_km=1.0, max_results=max_results,
+                                                 tile_cache=tiles)
+
+            # cold: empty tile and image caches
+            results.append(measure("get_nearby_pois", query, repeat=1, warmup=0, memory=False,
+                                   cache="cold", area_pois=area_pois, latency_s=latency))
+            results.append(measure("get_nearby_pois", query, repeat=5, warmup=0,
+                                   cache="warm", area_pois=area_pois, latency_s=latency))
+            results[-1]["stand_in_requests"] = dict(server.requests)
+        finally:
+            (retrieval.OVERPASS_URL, retrieval.REFERENCE_DIR, enrichment.WIKIDATA_API_URL,
+             enrichment.COMMONS_FILEPATH_URL, enrichment.WIKIPEDIA_SUMMARY_URL) = saved
+    return results
+
+
+def bench_overlay(repeat: int) -> List[Dict]:
+    from overlay import draw_overlay
+
+    results = []
+    for w, h in ((1280, 720), (1920, 1080)):
+        frame = synthetic_frame(0, (w, h))
+        out = np.empty_like(frame)
+        results.append(measure("draw_overlay", lambda: draw_overlay(frame, "Synthetic castle 42", score=0.8123,
+                                                                    bbox=(100, 100, 300, 200), out=out),
+                               repeat, resolution=f"{w}x{h}"))
+    return results
+
+
+def bench_video(clip, video: str, size: int, backend: str) -> List[Dict]:
+    from analyze_video import analyze_video, sample_frames
+
+    engine = make_engine(clip)
+    with quiet():
+        engine.prepare_references(reference_pois(size))
+    sampled = sum(1 for _ in sample_frames(video, 10.0))
+    result = measure("analyze_video", lambda: analyze_video(video, engine, sample_fps=10.0, batch_size=16),
+                     repeat=1, warmup=0, items_per_call=sampled, memory=False, backend=backend, size=size)
+    result["frames_analyzed"] = sampled
+    return [result]
+
+
+# ---------------------------------------------------------------------- main
+
+
+def environment(args) -> Dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except Exception:
+        rev = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": rev or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "torch": sys.modules["torch"].__version__ if "torch" in sys.modules else None,
+        "args": vars(args),
+    }
+
+
+def max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def compare(baseline: Dict, current: Dict):
+    """Print the p50 latency of every stage present in both result files."""
+    def key(r):
+        labels = {k: v for k, v in r.items() if k in ("stage", "backend", "size", "index", "batch", "cache", "resolution")}
+        return json.dumps(labels, sort_keys=True)
+
+    before = {key(r): r for r in baseline["results"]}
+    print(f"\nComparison with {baseline['meta'].get('git')} ({baseline['meta'].get('timestamp')}):")
+    for r in current["results"]:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("nan")
+        print(f"  {key(r):<90} {old['p50_ms']:9.3f} -> {r['p50_ms']:9.3f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the recognition pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000], help="reference set sizes")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per latency stage")
+    parser.add_argument("--frames", type=int, default=120, help="frames in the synthetic video")
+    parser.add_argument("--area-pois", type=int, default=2000, help="POIs served by the Overpass stand-in")
+    parser.add_argument("--max-results", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in delay per request (s)")
+    parser.add_argument("--real", choices=["auto", "never"], default="auto",
+                        help="also benchmark the real CLIP model when it can be loaded")
+    parser.add_argument("--real-size", type=int, default=100, help="reference set size for the real model")
+    parser.add_argument("--stages", nargs="+", default=["encode", "match", "retrieval", "overlay", "video"])
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="previous results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    results: List[Dict] = []
+    workdir = tempfile.mkdtemp(prefix="monument-bench-")
+    frames = [synthetic_frame(i) for i in range(32)]
+    backends = [("stub", StubClip())]
+    if args.real == "auto" and ({"encode", "match", "video"} & set(args.stages)):
+        with quiet():
+            clip = load_real_clip()
+        if clip is not None:
+            backends.append((clip.backend, clip))
+        else:
+            print("Real CLIP model not available, benchmarking the stub backend only")
+
+    for backend, clip in backends:
+        real = backend != "stub"
+        if "encode" in args.stages:
+            print(f"encode_images ({backend})")
+            results += bench_encode(clip, frames, max(3, args.repeat // 5) if real else args.repeat, backend)
+        if "match" in args.stages:
+            print(f"references and matching ({backend})")
+            if real:
+                image_dir = os.path.join(workdir, "real_refs")
+                os.makedirs(image_dir, exist_ok=True)
+                results += bench_matching(clip, [args.real_size], frames, max(3, args.repeat // 5), backend, image_dir)
+            else:
+                results += bench_matching(clip, args.sizes, frames, args.repeat, backend)
+        if "video" in args.stages:
+            print(f"offline video analysis ({backend})")
+            video = os.path.join(workdir, "synthetic.avi")
+            if not os.path.exists(video):
+                make_video(video, frames=args.frames)
+            results += bench_video(clip, video, args.real_size if real else max(args.sizes), backend)
+    if "retrieval" in args.stages:
+        print("POI retrieval against the local stand-in")
+        results += bench_retrieval(args.area_pois, args.max_results, args.latency, workdir)
+    if "overlay" in args.stages:
+        print("overlay rendering")
+        results += bench_overlay(args.repeat * 4)
+
+    report = {"meta": environment(args), "max_rss_mb": max_rss_mb(), "results": results}
+    with open(args.output, "w", encoding="utf8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(results)} results to {args.output} (max RSS {report['max_rss_mb']:.0f} MB)")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Offline stand-ins: a deterministic CLIP backend and a local Overpass/Wikidata server."""
+import json
+import re
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import reference_image
+
+
+class StubClip:
+    """Deterministic drop-in for `ClipModel` with no model weights.
+
+    Texts and image paths map to fixed pseudo-random vectors (seeded by
+    CRC32 of the content); frames are projected from a 16x16 thumbnail with
+    a fixed random matrix, so similar frames get similar embeddings and the
+    per-frame cost stays small and stable. Assign it to `MatchEngine.clip`.
+    """
+
+    backend = "stub"
+    model_name = "stub"
+    pretrained = "none"
+    loaded = True
+    load_started = None
+    load_seconds = None
+
+    def __init__(self, dim: int = 512, device: str = "cpu"):
+        self.dim = dim
+        self.device = device
+        self._proj = np.random.default_rng(0).standard_normal((16 * 16 * 3, dim)).astype(np.float32)
+
+    def load(self):
+        return self
+
+    def warm_up(self):
+        return self
+
+    def _seeded(self, items: List[str]) -> np.ndarray:
+        out = np.empty((len(items), self.dim), dtype=np.float32)
+        for i, s in enumerate(items):
+            out[i] = np.random.default_rng(zlib.crc32(s.encode("utf8"))).standard_normal(self.dim)
+        return out
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        return self._seeded(["text:" + t for t in texts])
+
+    def encode_image_files(self, paths: List[str], **kwargs):
+        return self._seeded(["image:" + p for p in paths]), np.ones(len(paths), dtype=bool)
+
+    def encode_images(self, items) -> np.ndarray:
+        frames = [it for it in items if isinstance(it, np.ndarray)]
+        if len(frames) != len(items):
+            return self._seeded(["image:" + str(it) for it in items])
+        thumbs = np.stack([cv2.resize(f, (16, 16), interpolation=cv2.INTER_AREA) for f in frames])
+        x = thumbs.reshape(len(frames), -1).astype(np.float32) / 255.0 - 0.5
+        return x @ self._proj
+
+
+class StandInServer:
+    """Local HTTP server answering like Overpass, Wikidata, Commons and Wikipedia.
+
+    Serves a fixed POI list: Overpass queries return the POIs inside the
+    requested bounding box (JSON), `wbgetentities` returns a P18 image for
+    every POI with a Wikidata id, Commons file paths and Wikipedia summaries
+    return small generated images and text. `latency` adds a fixed delay
+    per request to mimic a remote service. `urls()` gives the endpoints to
+    plug into `geo.poi_retrieval` / `geo.poi_enrichment`.
+
+    Usage:
+        with StandInServer(pois) as server:
+            geo.poi_retrieval.OVERPASS_URL = server.urls()["overpass"]
+    """
+
+    _BBOX = re.compile(r"\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)")
+
+    def __init__(self, pois: List[Dict], latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.pois = pois
+        self.latency = latency
+        self._lat = np.array([p["lat"] for p in pois], dtype=np.float64)
+        self._lon = np.array([p["lon"] for p in pois], dtype=np.float64)
+        self._by_qid = {p["tags"]["wikidata"]: p for p in pois if "wikidata" in p.get("tags", {})}
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def urls(self) -> Dict[str, str]:
+        base = f"http://{self._server.server_address[0]}:{self._server.server_address[1]}"
+        return {
+            "overpass": base + "/api/interpreter",
+            "wikidata": base + "/w/api.php",
+            "commons": base + "/wiki/Special:FilePath/",
+            "wikipedia": base + "/api/rest_v1/page/summary/",
+        }
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def overpass(self, query: str) -> bytes:
+        m = self._BBOX.search(query)
+        elements = []
+        if m:
+            s, w, n, e = (float(v) for v in m.groups())
+            inside = np.flatnonzero((self._lat >= s) & (self._lat <= n) & (self._lon >= w) & (self._lon <= e))
+            for i in inside.tolist():
+                p = self.pois[i]
+                elements.append({"type": "node", "id": p["id"], "lat": p["lat"], "lon": p["lon"], "tags": p["tags"]})
+        return json.dumps({"version": 0.6, "elements": elements}).encode("utf8")
+
+    def wikidata(self, query: Dict) -> bytes:
+        ids = query.get("ids", [""])[0].split("|")
+        entities = {}
+        for qid in ids:
+            if qid in self._by_qid:
+                value = f"{qid}.jpg"
+                entities[qid] = {"claims": {"P18": [{"mainsnak": {"datavalue": {"value": value}}}]}}
+            else:
+                entities[qid] = {"missing": ""}
+        return json.dumps({"entities": entities}).encode("utf8")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _route(self, body: bytes = b""):
+                if server.latency:
+                    threading.Event().wait(server.latency)
+                url = urlsplit(self.path)
+                if url.path == "/api/interpreter":
+                    server._count("overpass")
+                    query = unquote(body.decode("utf8")) if body else parse_qs(url.query).get("data", [""])[0]
+                    self._send(200, server.overpass(query), "application/json")
+                elif url.path == "/w/api.php":
+                    server._count("wikidata")
+                    self._send(200, server.wikidata(parse_qs(url.query)), "application/json")
+                elif url.path.startswith("/wiki/Special:FilePath/"):
+                    server._count("commons")
+                    self._send(200, reference_image(unquote(url.path.rsplit("/", 1)[1])), "image/jpeg")
+                elif url.path.startswith("/api/rest_v1/page/summary/"):
+                    server._count("wikipedia")
+                    title = unquote(url.path.rsplit("/", 1)[1])
+                    summary = {
+                        "title": title,
+                        "extract": f"{title} is a synthetic monument.",
+                        "thumbnail": {"source": server.urls()["commons"] + quote(title + ".jpg")},
+                    }
+                    self._send(200, json.dumps(summary).encode("utf8"), "application/json")
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def do_GET(self):
+                self._route()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self._route(self.rfile.read(length))
+
+        return Handler
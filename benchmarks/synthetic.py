@@ -0,0 +1,69 @@
+"""Deterministic synthetic inputs: videos, frames, POI sets and reference images."""
+import math
+import os
+import zlib
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+# Rocamadour area, where the demo video was shot
+DEFAULT_CENTER = (44.5216141, 1.9397062)
+HISTORIC_KINDS = ("castle", "monument", "church", "ruins", "memorial", "archaeological_site")
+
+
+def synthetic_frame(index: int, size: Tuple[int, int] = (640, 480), seed: int = 0) -> np.ndarray:
+    """A textured BGR frame that drifts slowly with `index` (camera pan)."""
+    w, h = size
+    rng = np.random.default_rng(seed)
+    base = cv2.resize(rng.integers(0, 256, (h // 16 + 2, w // 16 + 2, 3), dtype=np.uint8),
+                      (w + 32, h + 32), interpolation=cv2.INTER_CUBIC)
+    dx = int(16 + 12 * math.sin(index / 25.0))
+    dy = int(16 + 12 * math.cos(index / 40.0))
+    frame = np.ascontiguousarray(base[dy:dy + h, dx:dx + w])
+    # a moving "monument" so consecutive frames are not identical
+    cx = int(w * (0.3 + 0.4 * ((index % 200) / 200.0)))
+    cv2.rectangle(frame, (cx - 40, h // 3), (cx + 40, h - 40), (60, 90, 160), -1)
+    return frame
+
+
+def make_video(path: str, frames: int = 300, size: Tuple[int, int] = (640, 480), fps: float = 30.0) -> str:
+    """Write a synthetic MJPG video (readable by every OpenCV build) and return its path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    try:
+        for i in range(frames):
+            writer.write(synthetic_frame(i, size))
+    finally:
+        writer.release()
+    return path
+
+
+def synthetic_pois(n: int, center: Tuple[float, float] = DEFAULT_CENTER, radius_km: float = 5.0,
+                   seed: int = 0, wikidata_fraction: float = 0.8) -> List[Dict]:
+    """`n` named historic POIs scattered uniformly within `radius_km` of `center`.
+
+    Most carry a Wikidata id (Q1000000 + i) so image enrichment can resolve them.
+    """
+    rng = np.random.default_rng(seed)
+    r = radius_km * 1000.0 * np.sqrt(rng.random(n))
+    theta = rng.random(n) * 2 * math.pi
+    lat = center[0] + (r * np.cos(theta)) / 111_320.0
+    lon = center[1] + (r * np.sin(theta)) / (111_320.0 * math.cos(math.radians(center[0])))
+    kinds = rng.integers(0, len(HISTORIC_KINDS), n)
+    with_qid = rng.random(n) < wikidata_fraction
+    pois = []
+    for i in range(n):
+        tags = {"name": f"Synthetic {HISTORIC_KINDS[kinds[i]]} {i}", "historic": HISTORIC_KINDS[kinds[i]]}
+        if with_qid[i]:
+            tags["wikidata"] = f"Q{1_000_000 + i}"
+        pois.append({"id": i + 1, "name": tags["name"], "lat": float(lat[i]), "lon": float(lon[i]), "tags": tags})
+    return pois
+
+
+def reference_image(key: str, size: int = 256) -> bytes:
+    """JPEG bytes of a small image whose colors are derived from `key`."""
+    rng = np.random.default_rng(zlib.crc32(key.encode("utf8")))
+    img = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (size, size), interpolation=cv2.INTER_CUBIC)
+    ok, buf = cv2.imencode(".jpg", img)
+    return buf.tobytes()
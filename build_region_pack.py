@@ -0,0 +1,150 @@
+"""Build a region pack: everything needed to recognize monuments in an area, offline.
+
+Retrieves the POIs of a bounding box or around a list of centers, fetches
+their reference images, encodes them once and writes a single versioned,
+memory-mapped file (see `geo.region_pack`) with the POI table, float16
+reference embeddings and optional JPEG thumbnails. Point `app` /
+`analyze_video` at the pack and POI retrieval and reference preparation
+need neither the network nor model forward passes.
+
+    python build_region_pack.py --bbox 44.50 1.90 44.55 1.98 --output data/packs/rocamadour.mrpk
+    python build_region_pack.py --center 44.5216 1.9397 --center 44.6 1.85 --radius-km 2 \\
+        --output data/packs/lot.mrpk
+"""
+import argparse
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+
+from utils import instrument
+from utils.geoutils import haversine_km
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THUMB_SIZE = 128
+
+
+def thumbnail_jpeg(path: str, size: int = DEFAULT_THUMB_SIZE, quality: int = 85) -> Optional[bytes]:
+    """JPEG bytes of the image at `path` scaled so its longer side is `size` pixels."""
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    scale = size / max(h, w)
+    if scale < 1.0:
+        img = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes() if ok else None
+
+
+def region_of(centers: Sequence[Tuple[float, float]], radius_km: float) -> List[float]:
+    """Bounding box [south, west, north, east] of the circles around `centers`."""
+    dlat = radius_km / 111.0
+    south = min(lat for lat, _ in centers) - dlat
+    north = max(lat for lat, _ in centers) + dlat
+    dlon = radius_km / max(1e-6, 111.0 * math.cos(math.radians(max(abs(south), abs(north)))))
+    return [south, min(lon for _, lon in centers) - dlon, north, max(lon for _, lon in centers) + dlon]
+
+
+def collect_pois(centers: Sequence[Tuple[float, float]], radius_km: float, max_pois: int,
+                 bbox: Optional[Sequence[float]] = None) -> List[Dict]:
+    """POIs around every center (with their reference images), de-duplicated, optionally clipped to `bbox`."""
+    from geo.poi_retrieval import get_nearby_pois
+    from vision.match_engine import poi_key
+
+    pois: Dict[str, Dict] = {}
+    for lat, lon in centers:
+        for p in get_nearby_pois(lat, lon, radius_km=radius_km, max_results=max_pois):
+            if p.get("lat") is None or p.get("lon") is None:
+                continue
+            if bbox is not None and not (bbox[0] <= p["lat"] <= bbox[2] and bbox[1] <= p["lon"] <= bbox[3]):
+                continue
+            pois.setdefault(poi_key(p), p)
+    return list(pois.values())
+
+
+def build_pack(
+    output: str,
+    centers: Optional[Sequence[Tuple[float, float]]] = None,
+    bbox: Optional[Sequence[float]] = None,
+    radius_km: float = 2.0,
+    max_pois: int = 1000,
+    thumb_size: int = DEFAULT_THUMB_SIZE,
+    engine_kwargs: Optional[Dict] = None,
+) -> Dict:
+    """Build a region pack for `bbox` (south, west, north, east) or around `centers`.
+
+    A bounding box is covered by the circle through its corners and POIs
+    outside it are dropped. Returns the pack header.
+    """
+    from geo.region_pack import write_pack
+    from vision.clip_model import PREPROCESS_VERSION
+    from vision.match_engine import MatchEngine
+
+    if bbox is not None:
+        south, west, north, east = bbox
+        centers = [((south + north) / 2, (west + east) / 2)]
+        radius_km = haversine_km(south, west, north, east) / 2
+        region = {"bbox": list(bbox)}
+    elif centers:
+        region = {"bbox": region_of(centers, radius_km), "centers": [list(c) for c in centers], "radius_km": radius_km}
+    else:
+        raise ValueError("Need a bounding box or at least one center")
+
+    start = time.perf_counter()
+    # the model loads while POIs and images are retrieved
+    engine = MatchEngine(warm_up=True, **(engine_kwargs or {}))
+    pois = collect_pois(centers, radius_km, max_pois, bbox=bbox)
+    logger.info("Collected %d POIs for the pack", len(pois))
+    engine.prepare_references(pois)
+    refs = engine.refs
+    if not refs:
+        raise RuntimeError("No POIs with reference images in this region")
+
+    thumbnails = [thumbnail_jpeg(p["image_path"], thumb_size) for p in refs] if thumb_size > 0 else None
+    model = {
+        "model_name": engine.clip.model_name,
+        "pretrained": engine.clip.pretrained,
+        "preprocess_version": PREPROCESS_VERSION,
+        "backend": engine.clip.backend,
+    }
+    header = write_pack(output, refs, engine.ref_text_embeddings, engine.ref_image_embeddings,
+                        model=model, region=region, thumbnails=thumbnails)
+    logger.info("Wrote %s: %d POIs, %.1f MB in %.1fs", output, header["count"],
+                os.path.getsize(output) / 1e6, time.perf_counter() - start)
+    return header
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an offline region pack (POIs, embeddings, thumbnails)")
+    area = parser.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    area.add_argument("--center", type=float, nargs=2, action="append", metavar=("LAT", "LON"),
+                      help="repeat for several centers")
+    parser.add_argument("--radius-km", type=float, default=2.0, help="radius around each center")
+    parser.add_argument("--max-pois", type=int, default=1000, help="per center (or for the bbox)")
+    parser.add_argument("--thumb-size", type=int, default=DEFAULT_THUMB_SIZE, help="0 stores no thumbnails")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--backend", default=None, help="CLIP backend the pack is built for")
+    parser.add_argument("--output", required=True, help="pack file, e.g. data/packs/<region>.mrpk")
+    parser.add_argument("--log-level", default=None)
+    args = parser.parse_args(argv)
+
+    instrument.configure_logging(args.log_level)
+    build_pack(
+        args.output,
+        centers=[tuple(c) for c in args.center] if args.center else None,
+        bbox=args.bbox,
+        radius_km=args.radius_km,
+        max_pois=args.max_pois,
+        thumb_size=args.thumb_size,
+        engine_kwargs={"device": args.device, "clip_backend": args.backend},
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
+import collections
+import threading
+import time
+
 import cv2
-from typing import Iterator, Optional
+import numpy as np
+from typing import Dict, Iterator, Optional
+
+from utils import instrument
+
+LATEST = "latest"
+LOSSLESS = "lossless"
 
 
 class CameraStream:
@@ -9,37 +19,274 @@ class CameraStream:
         stream = CameraStream(src=0)  # webcam
         for frame in stream.frames():
             # process frame
+
+        stream = CameraStream(src="walk.mp4", width=1280, height=720, inference_fps=2, inference_size=256)
+        for packet in stream.packets():
+            show(packet["frame"])
+            if packet["inference"] is not None:
+                submit(packet["inference"])
+
+    Frames are sampled by time (video time for files, wall-clock time for
+    live sources): with `display_fps` only one frame per 1/display_fps
+    seconds is decoded. The frames in between are skipped with `grab()`
+    and never converted to images. For files, a gap longer than
+    `seek_gap_s` seconds is crossed with a seek instead. Every decoded
+    frame is downscaled once, right after decoding, to fit in
+    `width` x `height`; for files that size is otherwise never applied by
+    the capture backend. `inference_fps` marks a subset of the delivered
+    frames for inference, downscaled separately so their shorter side is
+    `inference_size` pixels (None: the display frame itself). Without
+    `inference_fps`, every delivered frame is an inference frame.
+
+    With `threaded=True` decoding runs on a producer thread that fills a
+    bounded ring buffer of `queue_size` frames, so a slow consumer never stalls
+    the capture. The `policy` decides what happens when the consumer falls
+    behind:
+      - "latest": old frames are dropped and the consumer always receives the
+        freshest decoded frame (default for webcams / live sources); frames
+        carrying an inference frame are dropped last and delivered before
+        the consumer skips ahead, so lag does not starve inference
+      - "lossless": the producer waits for room, every frame is delivered
+        (default for video files)
+    `stats()` reports read / decoded / skipped / delivered / dropped counters
+    and queue depth.
     """
 
-    def __init__(self, src: Optional[str | int] = 0, width: int = 640, height: int = 480):
+    def __init__(
+        self,
+        src: Optional[str | int] = 0,
+        width: Optional[int] = 640,
+        height: Optional[int] = 480,
+        threaded: bool = False,
+        policy: Optional[str] = None,
+        queue_size: int = 4,
+        display_fps: Optional[float] = None,
+        inference_fps: Optional[float] = None,
+        inference_size: Optional[int] = None,
+        seek_gap_s: float = 2.0,
+    ):
         self.src = src
         self.width = width
         self.height = height
+        self.display_fps = display_fps
+        self.inference_fps = inference_fps
+        self.inference_size = inference_size
+        self.seek_gap_s = seek_gap_s
+        self.live = isinstance(src, int)
+        self.source_fps: Optional[float] = None
         self.cap = None
 
+        if policy is None:
+            policy = LATEST if isinstance(src, int) else LOSSLESS
+        if policy not in (LATEST, LOSSLESS):
+            raise ValueError(f"Unknown capture policy: {policy!r}")
+        self.threaded = threaded
+        self.policy = policy
+        self.queue_size = max(1, queue_size)
+
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._eof = False
+        self._thread = None
+        self.frames_read = 0
+        self.frames_decoded = 0
+        self.frames_skipped = 0
+        self.seeks = 0
+        self.frames_delivered = 0
+        self.frames_dropped = 0
+        self.max_queue_depth = 0
+
     def __enter__(self):
         self.cap = cv2.VideoCapture(self.src)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.width and self.height:
+            # honoured by cameras only; file frames are downscaled in _decoded
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
         return self
 
     def __exit__(self, exc_type, exc, tb):
+        self._stop_producer()
         if self.cap is not None:
             self.cap.release()
 
-    def frames(self) -> Iterator:
+    def frames(self) -> Iterator[np.ndarray]:
         """Yield frames from the source until exhausted.
 
-        Yields OpenCV BGR frames.
+        Yields OpenCV BGR frames (the display frames of `packets`).
+        """
+        for packet in self.packets():
+            yield packet["frame"]
+
+    def packets(self) -> Iterator[Dict]:
+        """Yield {"index", "timestamp", "frame", "inference"} for every sampled frame.
+
+        `index` is the frame number in the source, `timestamp` its time in
+        seconds, `frame` the display frame and `inference` the inference
+        frame, or None when this frame is not due for inference.
         """
         with self:
             if not self.cap or not self.cap.isOpened():
                 raise RuntimeError(f"Unable to open video source: {self.src}")
-            while True:
-                ret, frame = self.cap.read()
-                if not ret:
+            self._stop.clear()
+            if self.threaded:
+                yield from self._threaded_frames()
+                return
+            for packet in self._decoded():
+                self.frames_delivered += 1
+                yield packet
+
+    def stats(self) -> Dict:
+        with self._cond:
+            depth = len(self._queue)
+        return {
+            "policy": self.policy if self.threaded else "sync",
+            "frames_read": self.frames_read,
+            "frames_decoded": self.frames_decoded,
+            "frames_skipped": self.frames_skipped,
+            "seeks": self.seeks,
+            "frames_delivered": self.frames_delivered,
+            "frames_dropped": self.frames_dropped,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+    # ------------------------------------------------------------- sampling
+    @staticmethod
+    def _downscale(frame: np.ndarray, scale: float) -> np.ndarray:
+        if scale >= 1.0:
+            return frame
+        h, w = frame.shape[:2]
+        return cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def _display_frame(self, frame: np.ndarray) -> np.ndarray:
+        if not (self.width and self.height):
+            return frame
+        h, w = frame.shape[:2]
+        return self._downscale(frame, min(self.width / w, self.height / h))
+
+    def _inference_frame(self, frame: np.ndarray, display: np.ndarray) -> np.ndarray:
+        if not self.inference_size:
+            return display
+        # from the display frame when it is still large enough: smaller source
+        source = display if min(display.shape[:2]) >= self.inference_size else frame
+        return self._downscale(source, self.inference_size / min(source.shape[:2]))
+
+    def _decoded(self) -> Iterator[Dict]:
+        """Grab every frame, decode and downscale only the sampled ones."""
+        fps = self.source_fps or 30.0
+        total = 0 if self.live else int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        display_step = 1.0 / self.display_fps if self.display_fps else 0.0
+        infer_step = 1.0 / self.inference_fps if self.inference_fps else None
+        next_display = next_infer = 0.0
+        index = -1
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            if display_step and not self.live:
+                # first frame at or after the next display time
+                target = int(np.ceil((next_display - 1e-9) * fps))
+                # the frame count may be an estimate: near the end, grab to EOF instead
+                if (target - (index + 1) > self.seek_gap_s * fps and (not total or target < total)
+                        and self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)):
+                    # containers may land on an earlier keyframe: use where the seek ended up
+                    position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) or target
+                    self.frames_skipped += max(0, position - (index + 1))
+                    self.seeks += 1
+                    index = position - 1
+            if not self.cap.grab():
+                break
+            index += 1
+            self.frames_read += 1
+            t = time.perf_counter() - start if self.live else index / fps
+            if t + 1e-9 < next_display:
+                self.frames_skipped += 1
+                continue
+            with instrument.span("frame_decode"):
+                ok, frame = self.cap.retrieve()
+                if not ok:
                     break
-                yield frame
+                display = self._display_frame(frame)
+            self.frames_decoded += 1
+            next_display += display_step
+            if next_display <= t:
+                # fell behind (slow source, inexact seek): restart the grid here
+                next_display = t + display_step
+
+            inference = None
+            if infer_step is None or t + 1e-9 >= next_infer:
+                inference = self._inference_frame(frame, display)
+                if infer_step is not None:
+                    next_infer += infer_step
+                    if next_infer <= t:
+                        next_infer = t + infer_step
+            yield {"index": index, "timestamp": t, "frame": display, "inference": inference}
+
+    # ------------------------------------------------------------ threading
+    def _produce(self):
+        for packet in self._decoded():
+            with self._cond:
+                if self.policy == LOSSLESS:
+                    while len(self._queue) >= self.queue_size and not self._stop.is_set():
+                        self._cond.wait(0.1)
+                elif len(self._queue) >= self.queue_size:
+                    self._drop_one()
+                self._queue.append(packet)
+                self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+                self._cond.notify_all()
+        with self._cond:
+            self._eof = True
+            self._cond.notify_all()
+
+    def _drop_one(self):
+        """Make room under the latest policy, sparing frames due for inference. Lock held."""
+        for i, p in enumerate(self._queue):
+            if p["inference"] is None:
+                del self._queue[i]
+                break
+        else:
+            # all due for inference: the oldest is superseded by newer ones
+            self._queue.popleft()
+        self.frames_dropped += 1
+
+    def _threaded_frames(self) -> Iterator:
+        self._stop.clear()
+        self._eof = False
+        self._queue.clear()
+        self._thread = threading.Thread(target=self._produce, name="camera-capture", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self._eof:
+                        self._cond.wait(0.1)
+                    if not self._queue:
+                        break
+                    if self.policy == LATEST:
+                        # skip straight to the freshest frame, but not past a
+                        # frame due for inference: that one is delivered first
+                        due = [i for i, p in enumerate(self._queue) if p["inference"] is not None]
+                        skip = due[-1] if due else len(self._queue) - 1
+                        for _ in range(skip):
+                            self._queue.popleft()
+                        self.frames_dropped += skip
+                        packet = self._queue.popleft()
+                    else:
+                        packet = self._queue.popleft()
+                    self.frames_delivered += 1
+                    self._cond.notify_all()
+                yield packet
+        finally:
+            self._stop_producer()
+
+    def _stop_producer(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+        self._thread = None
 
 
 if __name__ == "__main__":
@@ -1,40 +1,130 @@
 import json
+import logging
 import os
-from typing import Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
 
-import requests
+from utils.wikipedia_api import SummaryCache, default_summary_cache
+
+logger = logging.getLogger(__name__)
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 LOCAL_MONUMENTS = os.path.join(DATA_DIR, "monuments.json")
 
+NO_DESCRIPTION = "No description available."
+
+
+class InfoService:
+    """Monument descriptions from the local DB and a cached Wikipedia fallback.
+
+    `data/monuments.json` is read once into a dict (exact and case-insensitive
+    keys). Wikipedia summaries go through a persistent `SummaryCache`, which
+    also remembers pages that do not exist. `prefetch` warms that cache for a
+    set of names in the background, so `lookup` at match time is a couple of
+    dict reads and never touches the network.
+
+    Usage:
+        info = InfoService()
+        info.prefetch(p["name"] for p in engine.refs)
+        info.lookup("Eiffel Tower")     # {"name", "description"[, "pending"]}
+    """
+
+    def __init__(self, local_path: str = LOCAL_MONUMENTS, summaries: Optional[SummaryCache] = None,
+                 max_workers: int = 4):
+        self.summaries = summaries or default_summary_cache()
+        self.max_workers = max_workers
+        self._local: Dict[str, Dict] = {}
+        self._local_folded: Dict[str, Dict] = {}
+        self._prefetch_thread: Optional[threading.Thread] = None
+        self._load_local(local_path)
+
+    def _load_local(self, path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf8") as f:
+                db = json.load(f)
+        except Exception as e:
+            logger.warning("Could not read local monument DB %s: %s", path, e)
+            return
+        self._local = db
+        self._local_folded = {name.casefold(): entry for name, entry in db.items()}
+
+    def _local_entry(self, name: str) -> Optional[Dict]:
+        entry = self._local.get(name)
+        return entry if entry is not None else self._local_folded.get(name.casefold())
+
+    @staticmethod
+    def _from_summary(name: str, entry: Optional[Dict]) -> Optional[Dict]:
+        if entry is None:
+            return None
+        if not entry["found"]:
+            return {"name": name, "description": NO_DESCRIPTION}
+        return {"name": entry["title"], "description": entry["extract"]}
+
+    @property
+    def prefetching(self) -> bool:
+        """True while a `prefetch` is still running."""
+        return self._prefetch_thread is not None and self._prefetch_thread.is_alive()
+
+    def lookup(self, name: str) -> Dict:
+        """Description from the local DB or the summary cache only (no network).
+
+        A miss while `prefetch` is still running is marked `"pending": True`:
+        the placeholder text is temporary and the caller should look it up
+        again later.
+        """
+        local = self._local_entry(name)
+        if local:
+            return {"name": name, "description": local.get("description", "")}
+        info = self._from_summary(name, self.summaries.get(name))
+        if info is None:
+            info = {"name": name, "description": NO_DESCRIPTION, "pending": self.prefetching}
+        return info
+
+    def get(self, name: str) -> Dict:
+        """Like `lookup`, but queries Wikipedia (blocking) when nothing is cached."""
+        local = self._local_entry(name)
+        if local:
+            return {"name": name, "description": local.get("description", "")}
+        return self._from_summary(name, self.summaries.fetch(name)) or {"name": name, "description": NO_DESCRIPTION}
+
+    def prefetch(self, names: Iterable[str]) -> threading.Thread:
+        """Fetch summaries for `names` missing from both caches, in a background thread."""
+        todo = []
+        for name in dict.fromkeys(names):
+            if name and not self._local_entry(name) and self.summaries.get(name) is None:
+                todo.append(name)
+
+        def run():
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                list(pool.map(lambda n: self.summaries.fetch(n, persist=False), todo))
+            self.summaries.flush()
+            logger.info("Prefetched descriptions for %d POIs: %s", len(todo), self.summaries.stats())
+
+        self._prefetch_thread = threading.Thread(target=run, name="info-prefetch", daemon=True)
+        self._prefetch_thread.start()
+        return self._prefetch_thread
+
+
+_default_service: Optional[InfoService] = None
+_default_lock = threading.Lock()
+
 
-def _load_local(monument_name: str) -> Optional[Dict]:
-    if not os.path.exists(LOCAL_MONUMENTS):
-        return None
-    with open(LOCAL_MONUMENTS, "r", encoding="utf8") as f:
-        db = json.load(f)
-    return db.get(monument_name)
+def default_info_service() -> InfoService:
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = InfoService()
+        return _default_service
 
 
 def fetch_info(monument_name: str) -> Dict:
     """Fetch a short description for a monument.
 
     1) Try local JSON database `data/monuments.json`.
-    2) If not found, query Wikipedia REST API.
+    2) If not found, query Wikipedia REST API (cached, see `InfoService`).
     Returns a dict with at least 'name' and 'description' keys.
     """
-    local = _load_local(monument_name)
-    if local:
-        return {"name": monument_name, "description": local.get("description", "")}
-
-    # Fallback: Wikipedia REST summary
-    url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{requests.utils.quote(monument_name)}"
-    try:
-        r = requests.get(url, timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            return {"name": data.get("title", monument_name), "description": data.get("extract", "")}
-    except Exception:
-        pass
-
-    return {"name": monument_name, "description": "No description available."}
+    return default_info_service().get(monument_name)
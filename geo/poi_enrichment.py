@@ -0,0 +1,219 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from geo.poi_images import reference_image_path
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+# Endpoints are module-level so they can be pointed at a local stub server.
+WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
+COMMONS_FILEPATH_URL = "https://commons.wikimedia.org/wiki/Special:FilePath/"
+WIKIPEDIA_SUMMARY_URL = "https://en.wikipedia.org/api/rest_v1/page/summary/"
+HEADERS = {"User-Agent": "MonumentRecognizer/1.0"}
+
+# wbgetentities accepts at most 50 ids per request for anonymous clients
+WBGETENTITIES_BATCH = 50
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """Create a `requests.Session` with a connection pool sized for `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def resolve_p18(
+    qids: List[str],
+    session: requests.Session,
+    api_url: Optional[str] = None,
+    timeout: float = 10,
+) -> Dict[str, str]:
+    """Resolve the P18 (image) filename of many Wikidata items.
+
+    Uses batched `wbgetentities` requests (up to 50 ids each) instead of one
+    `Special:EntityData` request per item. Returns {qid: commons filename};
+    items without an image are omitted.
+    """
+    api_url = api_url or WIKIDATA_API_URL
+    unique = list(dict.fromkeys(q for q in qids if q))
+    images = {}
+    for start in range(0, len(unique), WBGETENTITIES_BATCH):
+        batch = unique[start:start + WBGETENTITIES_BATCH]
+        params = {
+            "action": "wbgetentities",
+            "ids": "|".join(batch),
+            "props": "claims",
+            "format": "json",
+        }
+        try:
+            with instrument.span("net.wikidata"):
+                r = session.get(api_url, params=params, timeout=timeout)
+            if r.status_code != 200:
+                logger.warning("wbgetentities returned status %d for %d ids", r.status_code, len(batch))
+                continue
+            entities = r.json().get("entities", {})
+        except Exception as e:
+            logger.warning("wbgetentities failed for %d ids: %s", len(batch), e)
+            continue
+        for qid, entity in entities.items():
+            for claim in entity.get("claims", {}).get("P18", []):
+                filename = claim.get("mainsnak", {}).get("datavalue", {}).get("value")
+                if filename:
+                    images[qid] = filename
+                    break
+    return images
+
+
+class _HostLimiter:
+    """Per-host concurrency limit shared by the download workers."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.Semaphore] = {}
+
+    def __call__(self, url: str) -> threading.Semaphore:
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.Semaphore(self.per_host)
+            return self._sems[host]
+
+
+def _download_atomic(session: requests.Session, url: str, out_path: str, limiter: _HostLimiter, timeout: float) -> bool:
+    """Download `url` to `out_path` via a temporary file, so readers never see partial images."""
+    with limiter(url), instrument.span("net.image_download"):
+        r = session.get(url, timeout=timeout, allow_redirects=True, stream=True)
+        try:
+            if r.status_code != 200:
+                return False
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(out_path), suffix=".part")
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
+                        size += len(chunk)
+                if size == 0:
+                    os.unlink(tmp)
+                    return False
+                os.replace(tmp, out_path)
+                instrument.count("net.image_bytes", size)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+            return True
+        finally:
+            r.close()
+
+
+def _wikipedia_thumbnail(session: requests.Session, name: str, limiter: _HostLimiter, base_url: str, timeout: float) -> Optional[str]:
+    url = f"{base_url}{requests.utils.quote(name)}"
+    with limiter(url), instrument.span("net.wikipedia_summary"):
+        r = session.get(url, timeout=timeout)
+    if r.status_code != 200:
+        return None
+    return r.json().get("thumbnail", {}).get("source")
+
+
+def enrich_pois(
+    pois: List[Dict],
+    dest_dir: str,
+    session: Optional[requests.Session] = None,
+    max_workers: int = 8,
+    per_host: int = 4,
+    timeout: float = 10,
+    wikidata_api_url: Optional[str] = None,
+    commons_url: Optional[str] = None,
+    wikipedia_url: Optional[str] = None,
+) -> List[Dict]:
+    """Attach a cached reference image (`image_path`) to every POI in place.
+
+    Same strategy as `fetch_and_cache_poi_image` (Wikidata P18, then the
+    Wikipedia summary thumbnail), but done in bulk: P18 claims are resolved
+    with batched `wbgetentities` calls, and images are downloaded concurrently
+    over one pooled session with at most `per_host` requests in flight per
+    host. Files are written atomically.
+
+    Returns one timing record per POI:
+      {"name", "image_path", "source", "seconds"}
+    where source is "cache", "wikidata", "wikipedia" or None.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    commons_url = commons_url or COMMONS_FILEPATH_URL
+    wikipedia_url = wikipedia_url or WIKIPEDIA_SUMMARY_URL
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=max_workers)
+    limiter = _HostLimiter(per_host)
+
+    timings: List[Optional[Dict]] = [None] * len(pois)
+    todo = []
+    for i, poi in enumerate(pois):
+        out_path = reference_image_path(poi, dest_dir)
+        if os.path.exists(out_path):
+            poi["image_path"] = out_path
+            timings[i] = {"name": poi.get("name"), "image_path": out_path, "source": "cache", "seconds": 0.0}
+        else:
+            todo.append((i, out_path))
+
+    t0 = time.perf_counter()
+    qids = [pois[i].get("tags", {}).get("wikidata") for i, _ in todo]
+    p18 = resolve_p18(qids, session, api_url=wikidata_api_url, timeout=timeout) if any(qids) else {}
+    resolve_seconds = time.perf_counter() - t0
+    if todo:
+        logger.info("Resolved %d Wikidata images for %d POIs in %.2fs", len(p18), len(todo), resolve_seconds)
+
+    def work(i: int, out_path: str) -> Dict:
+        poi = pois[i]
+        start = time.perf_counter()
+        source = None
+        filename = p18.get(poi.get("tags", {}).get("wikidata"))
+        try:
+            if filename:
+                url = f"{commons_url}{urllib.parse.quote(filename.replace(' ', '_'))}?width=800"
+                if _download_atomic(session, url, out_path, limiter, timeout):
+                    source = "wikidata"
+            if source is None and poi.get("name"):
+                thumb = _wikipedia_thumbnail(session, poi["name"], limiter, wikipedia_url, timeout)
+                if thumb and _download_atomic(session, thumb, out_path, limiter, timeout):
+                    source = "wikipedia"
+        except Exception as e:
+            logger.warning("Image fetch failed for %s: %s", poi.get('name'), e)
+        poi["image_path"] = out_path if source else None
+        return {
+            "name": poi.get("name"),
+            "image_path": poi["image_path"],
+            "source": source,
+            "seconds": time.perf_counter() - start,
+        }
+
+    try:
+        if todo:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {pool.submit(work, i, path): i for i, path in todo}
+                for fut, i in futures.items():
+                    timings[i] = fut.result()
+    finally:
+        if own_session:
+            session.close()
+
+    fetched = sum(1 for t in timings if t["source"] not in (None, "cache"))
+    cached = sum(1 for t in timings if t["source"] == "cache")
+    logger.info("Enriched %d POIs: %d cached, %d downloaded, %d without image in %.2fs",
+                len(pois), cached, fetched, len(pois) - cached - fetched, time.perf_counter() - t0)
+    return timings
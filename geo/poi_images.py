@@ -1,3 +1,4 @@
+import logging
 import os
 from typing import Dict, Optional
 
@@ -5,9 +6,23 @@ import requests
 from PIL import Image, ImageDraw, ImageFont
 import urllib.parse
 
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
 def _ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
+def reference_image_path(poi: Dict, dest_dir: str) -> str:
+    """Local cache path of a POI reference image (by Wikidata QID, else by name)."""
+    wikidata_id = poi.get('tags', {}).get('wikidata')
+    if wikidata_id:
+        safe_qid = wikidata_id.replace("/", "_")
+        return os.path.join(dest_dir, f"{safe_qid}.jpg")
+    # Use name as fallback for filename
+    safe_name = poi.get('name', 'unknown').replace("/", "_").replace(" ", "_")
+    return os.path.join(dest_dir, f"{safe_name}.jpg")
+
 def fetch_and_cache_poi_image(poi: Dict, dest_dir: str) -> Optional[str]:
     """Given a POI dict with at least 'name' key and optionally 'wikidata' in tags, 
     try to fetch a representative image and save it to dest_dir. 
@@ -26,27 +41,22 @@ def fetch_and_cache_poi_image(poi: Dict, dest_dir: str) -> Optional[str]:
     wikidata_id = poi.get('tags', {}).get('wikidata')
     
     # 1. Setup path and cache check
-    if wikidata_id:
-        safe_qid = wikidata_id.replace("/", "_")
-        out_path = os.path.join(dest_dir, f"{safe_qid}.jpg")
-    else:
-        # Use name as fallback for filename
-        safe_name = poi.get('name', 'unknown').replace("/", "_").replace(" ", "_")
-        out_path = os.path.join(dest_dir, f"{safe_name}.jpg")
+    out_path = reference_image_path(poi, dest_dir)
     
     if os.path.exists(out_path):
-        print(f"Using cached image: {out_path}")
+        logger.debug("Using cached image: %s", out_path)
         return out_path
 
     # --- STRATEGY 1: Fetch via Wikidata QID (P18 property) ---
     if wikidata_id:
         try:
-            print(f"Attempting Wikidata fetch for {wikidata_id}...")
+            logger.debug("Attempting Wikidata fetch for %s", wikidata_id)
             # Use EntityData API which provides complete entity information
             wikidata_api_url = f"https://www.wikidata.org/wiki/Special:EntityData/{wikidata_id}.json"
             
             headers = {"User-Agent": "MonumentRecognizer/1.0"}
-            r = requests.get(wikidata_api_url, timeout=10, headers=headers)
+            with instrument.span("net.wikidata"):
+                r = requests.get(wikidata_api_url, timeout=10, headers=headers)
             
             if r.status_code == 200:
                 data = r.json()
@@ -65,57 +75,58 @@ def fetch_and_cache_poi_image(poi: Dict, dest_dir: str) -> Optional[str]:
                     filename = datavalue.get("value")
                     
                     if filename:
-                        print(f"Found image on Wikidata: {filename}")
+                        logger.debug("Found image on Wikidata: %s", filename)
 
                         # Construct the URL to download from Wikimedia Commons
                         # Special:FilePath provides direct access to the file
                         filename_encoded = urllib.parse.quote(filename.replace(" ", "_"))
                         commons_file_url = f"https://commons.wikimedia.org/wiki/Special:FilePath/{filename_encoded}?width=800"
                         
-                        print(f"Fetching from Commons: {commons_file_url}")
-                        rr = requests.get(commons_file_url, timeout=10, allow_redirects=True, headers=headers)
+                        logger.debug("Fetching from Commons: %s", commons_file_url)
+                        with instrument.span("net.image_download"):
+                            rr = requests.get(commons_file_url, timeout=10, allow_redirects=True, headers=headers)
                         
                         if rr.status_code == 200 and len(rr.content) > 0:
                             with open(out_path, "wb") as f:
                                 f.write(rr.content)
-                            print(f"✓ Successfully saved Wikidata image to {out_path}")
+                            logger.debug("Saved Wikidata image to %s", out_path)
                             return out_path
                         else:
-                            print(f"✗ Commons returned status {rr.status_code}, content length: {len(rr.content)}")
+                            logger.warning("Commons returned status %d, content length: %d", rr.status_code, len(rr.content))
                     else:
-                        print("✗ No filename found in datavalue")
+                        logger.debug("No filename found in datavalue")
                 else:
-                    print(f"✗ No P18 (image) claims found for {wikidata_id}")
+                    logger.debug("No P18 (image) claims found for %s", wikidata_id)
             else:
-                print(f"✗ Wikidata API returned status {r.status_code}")
+                logger.warning("Wikidata API returned status %d", r.status_code)
                 
         except Exception as e:
-            print(f"✗ Wikidata fetch failed for {wikidata_id}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.warning("Wikidata fetch failed for %s: %s", wikidata_id, e, exc_info=True)
 
     # --- STRATEGY 2: Fallback to Wikipedia Summary ---
     poi_name = poi.get('name')
     if poi_name:
         try:
-            print(f"Attempting Wikipedia fetch for '{poi_name}'...")
+            logger.debug("Attempting Wikipedia fetch for %r", poi_name)
             url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{requests.utils.quote(poi_name)}"
-            r = requests.get(url, timeout=6)
+            with instrument.span("net.wikipedia_summary"):
+                r = requests.get(url, timeout=6)
             if r.status_code == 200:
                 data = r.json()
                 thumb = data.get("thumbnail", {})
                 thumb_url = thumb.get("source")
                 if thumb_url:
-                    print(f"Found Wikipedia thumbnail: {thumb_url}")
-                    rr = requests.get(thumb_url, timeout=6)
+                    logger.debug("Found Wikipedia thumbnail: %s", thumb_url)
+                    with instrument.span("net.image_download"):
+                        rr = requests.get(thumb_url, timeout=6)
                     if rr.status_code == 200:
                         with open(out_path, "wb") as f:
                             f.write(rr.content)
-                        print(f"Successfully saved Wikipedia image to {out_path}")
+                        logger.debug("Saved Wikipedia image to %s", out_path)
                         return out_path
         except Exception as e:
-            print(f"Wikipedia summary fetch failed for {poi_name}: {e}")
+            logger.warning("Wikipedia summary fetch failed for %s: %s", poi_name, e)
 
     # No image found
-    print(f"No image found for {poi.get('name', 'Unknown POI')}")
+    logger.info("No image found for %s", poi.get('name', 'Unknown POI'))
     return None
\ No newline at end of file
@@ -1,146 +1,190 @@
+import logging
 import math
 import time 
 import random
 import overpy
-from typing import List, Dict, Tuple
-from vision.clip_model import ClipModel
+from typing import List, Dict, Optional, Union
 
 import requests
-from geo.poi_images import fetch_and_cache_poi_image 
+from geo.poi_enrichment import enrich_pois
+from geo.region_pack import RegionPack, open_pack
+from geo.tile_cache import OverpassTileCache
+from utils import instrument
+from utils.geoutils import GridIndex, poi_coordinates
 
-def _haversine(lat1, lon1, lat2, lon2):
-    # meters
-    R = 6371000.0
-    import math
+logger = logging.getLogger(__name__)
 
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+TILE_CACHE_DIR = 'data/overpass_tiles/'
+REFERENCE_DIR = 'data/references/'
+# Overpass endpoint; None uses overpy's default public instance
+OVERPASS_URL = None
+# Region pack (path or RegionPack) answering queries inside its area offline
+REGION_PACK = None
 
+def _query_overpass_bbox(south: float, west: float, north: float, east: float) -> List[Dict]:
+    """Query Overpass for named POIs inside a bounding box.
 
-def get_nearby_pois(lat: float, lon: float, radius_km: float = 5.0, max_results: int = 100) -> List[Dict]:
+    Returns dictionaries with keys: name, lat, lon, tags (ways and relations use their center).
+    """
+    bbox = f"{south},{west},{north},{east}"
+    # Build Overpass query (simple): look for nodes/ways with some common tags
+    query = f"""
+    (node({bbox})[historic];
+    node({bbox})[tourism];
+    node({bbox})[amenity];
+    way({bbox})[historic];
+    relation({bbox})[historic];
+    );
+    out center meta;"""
+
+    api = overpy.Overpass(url=OVERPASS_URL) if OVERPASS_URL else overpy.Overpass()
+    with instrument.span("net.overpass"):
+        res = api.query(query)
+    pois = []
+
+    # nodes
+    for n in res.nodes:
+        name = n.tags.get("name")
+        if not name:
+            continue
+        pois.append({"name": name, "lat": float(n.lat), "lon": float(n.lon), "tags": dict(n.tags)})
+
+    # ways and relations (use center)
+    for e in list(res.ways) + list(res.relations):
+        name = e.tags.get("name")
+        if not name:
+            continue
+        latc = getattr(e, "center_lat", None)
+        lonc = getattr(e, "center_lon", None)
+        if latc is None or lonc is None:
+            continue
+        pois.append({"name": name, "lat": float(latc), "lon": float(lonc), "tags": dict(e.tags)})
+    return pois
+
+
+def _fetch_pois_tiled(lat: float, lon: float, radius_m: float, tile_cache: OverpassTileCache) -> List[Dict]:
+    """POIs within `radius_m` of (lat, lon), answered from cached tiles where possible.
+
+    Missing tiles are fetched with a single Overpass query over their bounding box.
+    """
+    tiles = tile_cache.tiles_around(lat, lon, radius_m)
+    pois, missing = tile_cache.lookup(tiles)
+    instrument.count("tile_cache.hit", len(tiles) - len(missing))
+    instrument.count("tile_cache.miss", len(missing))
+    logger.debug("Tile cache: %d/%d tiles cached", len(tiles) - len(missing), len(tiles))
+    if missing:
+        fetched = _query_overpass_bbox(*tile_cache.bbox_of(missing))
+        pois.extend(tile_cache.store(missing, fetched))
+
+    # tiles cover the bounding box: keep only POIs inside the radius, nearest first
+    lats, lons = poi_coordinates(pois)
+    idx, dist = GridIndex(lats, lons).query_radius(lat, lon, radius_m)
+    out = []
+    for i, d in zip(idx.tolist(), dist.tolist()):
+        p = pois[i]
+        p["__dist"] = d
+        out.append(p)
+    return out
+
+
+def _dedupe_by_name(pois: List[Dict]) -> List[Dict]:
+    """Keep the closest POI of each name; expects `__dist` on every POI."""
+    unique = {}
+    for p in pois:
+        key = p["name"]
+        if key not in unique or p["__dist"] < unique[key]["__dist"]:
+            unique[key] = p
+    return sorted(unique.values(), key=lambda x: x["__dist"])
+
+
+def get_nearby_pois(
+    lat: float,
+    lon: float,
+    radius_km: float = 5.0,
+    max_results: int = 100,
+    tile_cache: Optional[OverpassTileCache] = None,
+    pack: Optional[Union[str, RegionPack]] = None,
+) -> List[Dict]:
     """Try to retrieve POIs from OpenStreetMap Overpass API near (lat, lon).
 
+    Overpass results are cached on disk per geographic tile (see
+    `geo.tile_cache`), so repeated or nearby queries only fetch tiles that are
+    missing or expired. Pass `tile_cache` to override the default cache.
+
+    When (lat, lon) lies inside a region pack (`pack`, default
+    `REGION_PACK`), the POIs come from the pack with no network access; they
+    carry their reference embeddings, so `MatchEngine` does not encode them.
+
     If Overpass is unreachable or `overpy` is not available, this function falls back to a
     minimal remote Wikipedia search (via the REST summary) and returns approximate results.
     The returned POIs are dictionaries with keys: name, lat, lon, tags.
     """
+    pack = pack if pack is not None else REGION_PACK
+    if pack is not None:
+        if isinstance(pack, str):
+            pack = open_pack(pack)
+        if pack.covers(lat, lon):
+            out = _dedupe_by_name(pack.query(lat, lon, radius_km))[:max_results]
+            logger.info("Region pack %s: %d POIs within %s km", pack.path, len(out), radius_km)
+            return out
+        logger.warning("(%s, %s) is outside region pack %s, querying Overpass", lat, lon, pack.path)
+
     radius_m = int(radius_km * 1000)
+    if tile_cache is None:
+        tile_cache = OverpassTileCache(TILE_CACHE_DIR)
 
     # Retry parameters
     max_retries = 3
     delay_seconds = 2
 
     for attempt in range(max_retries):
-        print(f"Attempt {attempt + 1}/{max_retries}: Querying OSM Overpass for POIs within {radius_m} m of ({lat},{lon})")
-        
-        # Build Overpass query (simple): look for nodes/ways with some common tags
-        query = f"""
-        (node(around:{radius_m},{lat},{lon})[historic];
-        node(around:{radius_m},{lat},{lon})[tourism];
-        node(around:{radius_m},{lat},{lon})[amenity];
-        way(around:{radius_m},{lat},{lon})[historic];
-        relation(around:{radius_m},{lat},{lon})[historic];
-        );
-        out center meta;"""
+        logger.info("Attempt %d/%d: Querying OSM Overpass for POIs within %d m of (%s,%s)",
+                    attempt + 1, max_retries, radius_m, lat, lon)
 
         try:
-            api = overpy.Overpass()
-            res = api.query(query)
-            pois = []
-            
-            # nodes
-            for n in res.nodes:
-                name = n.tags.get("name")
-                if not name:
-                    continue
-                pois.append({"name": name, "lat": float(n.lat), "lon": float(n.lon), "tags": dict(n.tags)})
-            
-            # ways (use center)
-            for w in res.ways:
-                name = w.tags.get("name")
-                if not name:
-                    continue
-                latc = getattr(w, "center_lat", None)
-                lonc = getattr(w, "center_lon", None)
-                if latc is None or lonc is None:
-                    continue
-                pois.append({"name": name, "lat": float(latc), "lon": float(lonc), "tags": dict(w.tags)})
-            
-            # relations
-            for r in res.relations:
-                name = r.tags.get("name")
-                if not name:
-                    continue
-                latc = getattr(r, "center_lat", None)
-                lonc = getattr(r, "center_lon", None)
-                if latc is None or lonc is None:
-                    continue
-                pois.append({"name": name, "lat": float(latc), "lon": float(lonc), "tags": dict(r.tags)})
-
-            # de-duplicate by name, keep closest
-            unique = {}
-            for p in pois:
-                print(p)
-                key = p["name"]
-                d = _haversine(lat, lon, p["lat"], p["lon"]) if p.get("lat") else float("inf")
-                print(f"Distance: {d} meters")
-                if key not in unique or d < unique[key]["__dist"]:
-                    p["__dist"] = d
-                    unique[key] = p
-            
-            out = list(unique.values())
-            print(f"Found {len(out)} unique POIs")
+            pois = _fetch_pois_tiled(lat, lon, radius_m, tile_cache)
+
+            # de-duplicate by name, keep closest (distances computed during retrieval)
+            out = _dedupe_by_name(pois)
+            logger.debug("Found %d unique POIs", len(out))
             
-            out.sort(key=lambda x: x.get("__dist", float("inf")))
             out = out[:max_results]
-            print(f"After limiting to {max_results}: {len(out)} POIs")
+            logger.debug("After limiting to %d: %d POIs", max_results, len(out))
             
-            # Fetch images for each POI
-            for j in range(len(out)):
-                try:
-                    image = fetch_and_cache_poi_image(out[j], 'data/references/')
-                    out[j]['image_path'] = image
-                    print(f"Image for {out[j]['name']}: {out[j]['image_path']}")
-                except Exception as e:
-                    print(f"Failed to fetch image for {out[j]['name']}: {e}")
-                    out[j]['image_path'] = None
+            # Fetch images for all POIs (batched Wikidata lookups, concurrent downloads)
+            enrich_pois(out, REFERENCE_DIR)
             
             # Check if we got any POIs
             if len(out) == 0:
                 if attempt < max_retries - 1:
-                    print(f"No POIs found, retrying after {delay_seconds} seconds...")
+                    logger.warning("No POIs found, retrying after %d seconds", delay_seconds)
                     time.sleep(delay_seconds)
                     continue  # Try again
                 else:
-                    print("No POIs found after all retries")
+                    logger.warning("No POIs found after all retries")
                     raise Exception("No POIs found from Overpass")
             else:
                 # Success! Return the POIs
-                print(f"Successfully retrieved {len(out)} POIs")
+                logger.info("Retrieved %d POIs", len(out))
                 return out
 
         except overpy.exception.OverpassTooManyRequests:
-            print(f"Overpass rate limit hit, waiting {delay_seconds} seconds...")
+            logger.warning("Overpass rate limit hit, waiting %d seconds", delay_seconds)
             if attempt < max_retries - 1:
                 time.sleep(delay_seconds)
                 continue
             else:
-                print("Rate limit persists, falling back to Wikipedia search")
+                logger.warning("Rate limit persists, falling back to Wikipedia search")
                 
         except Exception as e:
-            print(f"Overpass query failed: {e}")
+            logger.warning("Overpass query failed: %s", e)
             if attempt < max_retries - 1:
-                print(f"Retrying after {delay_seconds} seconds...")
+                logger.info("Retrying after %d seconds", delay_seconds)
                 time.sleep(delay_seconds)
                 continue
 
     # If we get here, all Overpass attempts failed - fallback to Wikipedia
-    print("All Overpass attempts failed, falling back to Wikipedia search...")
+    logger.warning("All Overpass attempts failed, falling back to Wikipedia search")
     try:
         url = "https://en.wikipedia.org/w/api.php"
         params = {
@@ -150,7 +194,8 @@ def get_nearby_pois(lat: float, lon: float, radius_km: float = 5.0, max_results:
             "format": "json", 
             "srlimit": max_results
         }
-        r = requests.get(url, params=params, timeout=5)
+        with instrument.span("net.wikipedia_search"):
+            r = requests.get(url, params=params, timeout=5)
         data = r.json()
         results = []
         for item in data.get("query", {}).get("search", []):
@@ -162,14 +207,15 @@ def get_nearby_pois(lat: float, lon: float, radius_km: float = 5.0, max_results:
                 "tags": {},
                 "image_path": None
             })
-        print(f"Wikipedia fallback returned {len(results)} results")
+        logger.info("Wikipedia fallback returned %d results", len(results))
         return results
     except Exception as e:
-        print(f"Wikipedia fallback also failed: {e}")
+        logger.error("Wikipedia fallback also failed: %s", e)
         return []
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     pois = get_nearby_pois(44.53286, 1.88986)
     print(f"\nFound {len(pois)} POIs")
     for p in pois:
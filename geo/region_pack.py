@@ -0,0 +1,270 @@
+import json
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.geoutils import GridIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MRPK"
+FORMAT_VERSION = 1
+# magic, format version, header length
+_PREAMBLE = struct.Struct("<4sIQ")
+# sections start on cache-line boundaries so every array view is aligned
+_ALIGN = 64
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _blob(chunks: Sequence[Optional[bytes]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate byte strings into (offsets[n + 1], data); None is stored as empty."""
+    offsets = np.zeros(len(chunks) + 1, dtype=np.uint64)
+    offsets[1:] = np.cumsum([len(c) if c else 0 for c in chunks], dtype=np.uint64)
+    data = np.frombuffer(b"".join(c for c in chunks if c), dtype=np.uint8)
+    return offsets, data
+
+
+def write_pack(
+    path: str,
+    pois: List[Dict],
+    text_emb: np.ndarray,
+    image_emb: np.ndarray,
+    model: Dict,
+    region: Optional[Dict] = None,
+    thumbnails: Optional[Sequence[Optional[bytes]]] = None,
+) -> Dict:
+    """Write a region pack to `path` (atomically) and return its header.
+
+    `pois` are POI dicts (name, lat, lon, tags) aligned with the rows of the
+    normalized `text_emb` / `image_emb` matrices, stored as float16.
+    `model` identifies the embeddings ({"model_name", "pretrained",
+    "preprocess_version"}); `region` describes the covered area (e.g.
+    {"bbox": [south, west, north, east]}). `thumbnails` are optional JPEG
+    bytes per POI.
+    """
+    n = len(pois)
+    if text_emb.shape[0] != n or image_emb.shape[0] != n:
+        raise ValueError(f"{n} POIs but {text_emb.shape[0]} text / {image_emb.shape[0]} image embeddings")
+    dim = int(image_emb.shape[1]) if image_emb.ndim == 2 else 0
+
+    name_offsets, names = _blob([(p.get("name") or "").encode("utf8") for p in pois])
+    tag_offsets, tags = _blob([json.dumps(p.get("tags", {}), ensure_ascii=False, separators=(",", ":")).encode("utf8")
+                               for p in pois])
+    arrays = {
+        "lat": np.array([p["lat"] for p in pois], dtype="<f8"),
+        "lon": np.array([p["lon"] for p in pois], dtype="<f8"),
+        "name_offsets": name_offsets.astype("<u8"),
+        "names": names,
+        "tag_offsets": tag_offsets.astype("<u8"),
+        "tags": tags,
+        "text_emb": np.ascontiguousarray(text_emb, dtype="<f2").reshape(n, dim),
+        "image_emb": np.ascontiguousarray(image_emb, dtype="<f2").reshape(n, dim),
+    }
+    if thumbnails is not None:
+        thumb_offsets, thumbs = _blob(thumbnails)
+        arrays["thumb_offsets"] = thumb_offsets.astype("<u8")
+        arrays["thumbs"] = thumbs
+
+    sections, offset = {}, 0
+    for key, arr in arrays.items():
+        sections[key] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset = _aligned(offset + arr.nbytes)
+
+    lats, lons = arrays["lat"], arrays["lon"]
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.time(),
+        "count": n,
+        "dim": dim,
+        "model": dict(model),
+        "region": dict(region or {}),
+        "extent": [float(lats.min()), float(lons.min()), float(lats.max()), float(lons.max())] if n else None,
+        "thumbnails": thumbnails is not None,
+        "sections": sections,
+    }
+    head = json.dumps(header, ensure_ascii=False).encode("utf8")
+    data_start = _aligned(_PREAMBLE.size + len(head))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(head)))
+        f.write(head)
+        for key, arr in arrays.items():
+            f.seek(data_start + sections[key]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+    return header
+
+
+class RegionPack:
+    """Read-only view of a region pack: POIs, reference embeddings and thumbnails in one file.
+
+    The file is memory-mapped; columns are NumPy views into it, so opening a
+    pack reads only the header and costs milliseconds whatever its size.
+    POIs are materialized as the usual dicts (name, lat, lon, tags) on
+    demand; they also carry a `__pack` entry ((pack, row)) that lets
+    `MatchEngine` take their embeddings from the pack instead of encoding
+    reference images. Embeddings are stored normalized in float16.
+
+    Layout: a fixed preamble (magic, format version, header length), a JSON
+    header describing the model, the covered region and every section
+    (offset, dtype, shape), then the 64-byte aligned sections: `lat`, `lon`,
+    `names` / `tags` (UTF-8 blobs with offsets), `text_emb`, `image_emb` and
+    optionally `thumbs` (JPEG blobs).
+
+    Usage:
+        pack = RegionPack("data/packs/rocamadour.mrpk")
+        pois = pack.query(44.5216, 1.9397, radius_km=1.0)
+        engine.prepare_references(pois, position=(44.5216, 1.9397))
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise ValueError(f"{path} is not a region pack (truncated)")
+            magic, version, head_len = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a region pack")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"{path} has pack format {version}, this version reads {FORMAT_VERSION}")
+            header = json.loads(f.read(head_len).decode("utf8"))
+        self.header = header
+        data_start = _aligned(_PREAMBLE.size + head_len)
+
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        self._columns: Dict[str, np.ndarray] = {}
+        for key, s in header["sections"].items():
+            dtype = np.dtype(s["dtype"])
+            start = data_start + s["offset"]
+            nbytes = dtype.itemsize * math.prod(s["shape"])
+            if start + nbytes > self._mm.size:
+                raise ValueError(f"{path} is truncated (section {key})")
+            self._columns[key] = self._mm[start:start + nbytes].view(dtype).reshape(s["shape"])
+        self._index: Optional[GridIndex] = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.header["count"]
+
+    def __reduce__(self):
+        # re-map by path (once per process) when sent to another process
+        return (open_pack, (self.path,))
+
+    @property
+    def model(self) -> Dict:
+        return self.header["model"]
+
+    @property
+    def namespace(self) -> Tuple[str, str, int]:
+        """(model name, pretrained tag, preprocess version) the embeddings were made with."""
+        m = self.model
+        return (m.get("model_name"), m.get("pretrained"), m.get("preprocess_version"))
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self._columns["lat"]
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self._columns["lon"]
+
+    @property
+    def text_embeddings(self) -> np.ndarray:
+        return self._columns["text_emb"]
+
+    @property
+    def image_embeddings(self) -> np.ndarray:
+        return self._columns["image_emb"]
+
+    def _bytes(self, data: str, offsets: str, i: int) -> bytes:
+        o = self._columns[offsets]
+        return self._columns[data][int(o[i]):int(o[i + 1])].tobytes()
+
+    def name(self, i: int) -> str:
+        return self._bytes("names", "name_offsets", i).decode("utf8")
+
+    def tags(self, i: int) -> Dict:
+        return json.loads(self._bytes("tags", "tag_offsets", i).decode("utf8"))
+
+    def poi(self, i: int) -> Dict:
+        return {"name": self.name(i), "lat": float(self.lat[i]), "lon": float(self.lon[i]),
+                "tags": self.tags(i), "__pack": (self, i)}
+
+    def pois(self, indices: Optional[Sequence[int]] = None) -> List[Dict]:
+        indices = range(len(self)) if indices is None else indices
+        return [self.poi(int(i)) for i in indices]
+
+    def thumbnail(self, i: int) -> Optional[np.ndarray]:
+        """Decoded BGR thumbnail of POI `i`, or None if the pack has none."""
+        if "thumbs" not in self._columns:
+            return None
+        data = self._bytes("thumbs", "thumb_offsets", i)
+        if not data:
+            return None
+        import cv2
+
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def covers(self, lat: float, lon: float) -> bool:
+        """True if (lat, lon) lies inside the region the pack was built for."""
+        bbox = self.header["region"].get("bbox") or self.header.get("extent")
+        if not bbox:
+            return False
+        south, west, north, east = bbox
+        return south <= lat <= north and west <= lon <= east
+
+    def query(self, lat: float, lon: float, radius_km: float = 5.0, max_results: Optional[int] = None) -> List[Dict]:
+        """POIs within `radius_km` of (lat, lon), nearest first (with `__dist` in meters)."""
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = GridIndex(self.lat, self.lon)
+        idx, dist = self._index.query_radius(lat, lon, radius_km * 1000.0)
+        if max_results is not None:
+            idx, dist = idx[:max_results], dist[:max_results]
+        out = []
+        for i, d in zip(idx.tolist(), dist.tolist()):
+            p = self.poi(i)
+            p["__dist"] = d
+            out.append(p)
+        return out
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "pois": len(self),
+            "dim": self.header["dim"],
+            "model": self.model,
+            "thumbnails": self.header["thumbnails"],
+            "bytes": int(self._mm.size),
+            "created": self.header["created"],
+        }
+
+
+_packs: Dict[str, Tuple[float, RegionPack]] = {}
+_packs_lock = threading.Lock()
+
+
+def open_pack(path: str) -> RegionPack:
+    """Open `path` once per process and reuse the mapping until the file is rebuilt."""
+    key = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime
+    with _packs_lock:
+        cached = _packs.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = _packs[key] = (mtime, RegionPack(path))
+            logger.info("Opened region pack %s: %d POIs", path, len(cached[1]))
+        return cached[1]
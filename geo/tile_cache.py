@@ -0,0 +1,116 @@
+import gzip
+import json
+import math
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Tile = Tuple[int, int]
+
+# 0.01 deg ~= 1.1 km of latitude
+DEFAULT_TILE_DEG = 0.01
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+class OverpassTileCache:
+    """On-disk cache of Overpass POIs on a fixed lat/lon grid.
+
+    The world is cut into `tile_deg` x `tile_deg` tiles. Each tile stores the
+    POIs whose (center) coordinate falls inside it, as gzipped JSON rows
+    ``[name, lat, lon, tags]``. A radius query is answered by the union of the
+    tiles covering its bounding box, so overlapping or repeated queries share
+    tiles and only missing/expired tiles need to be fetched. An empty tile is
+    a valid cached answer.
+
+    Usage:
+        cache = OverpassTileCache("data/overpass_tiles/")
+        tiles = cache.tiles_around(lat, lon, radius_m)
+        pois, missing = cache.lookup(tiles)
+    """
+
+    def __init__(self, cache_dir: str, tile_deg: float = DEFAULT_TILE_DEG, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.tile_deg = tile_deg
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    # ----------------------------------------------------------------- grid
+    def tile_of(self, lat: float, lon: float) -> Tile:
+        return (math.floor(lat / self.tile_deg), math.floor(lon / self.tile_deg))
+
+    def tile_bbox(self, tile: Tile) -> Tuple[float, float, float, float]:
+        """(south, west, north, east) of a tile."""
+        i, j = tile
+        return (i * self.tile_deg, j * self.tile_deg, (i + 1) * self.tile_deg, (j + 1) * self.tile_deg)
+
+    def tiles_around(self, lat: float, lon: float, radius_m: float) -> List[Tile]:
+        """All tiles intersecting the bounding box of a circle of `radius_m` around (lat, lon)."""
+        dlat = radius_m / 111_000.0
+        dlon = radius_m / max(1e-6, 111_000.0 * math.cos(math.radians(lat)))
+        i0, j0 = self.tile_of(lat - dlat, lon - dlon)
+        i1, j1 = self.tile_of(lat + dlat, lon + dlon)
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def bbox_of(self, tiles: Iterable[Tile]) -> Tuple[float, float, float, float]:
+        tiles = list(tiles)
+        south = min(i for i, _ in tiles) * self.tile_deg
+        west = min(j for _, j in tiles) * self.tile_deg
+        north = (max(i for i, _ in tiles) + 1) * self.tile_deg
+        east = (max(j for _, j in tiles) + 1) * self.tile_deg
+        return south, west, north, east
+
+    # -------------------------------------------------------------- storage
+    def _path(self, tile: Tile) -> str:
+        return os.path.join(self.cache_dir, f"{self.tile_deg:g}", f"{tile[0]}_{tile[1]}.json.gz")
+
+    def get(self, tile: Tile) -> Optional[List[Dict]]:
+        """Cached POIs of a tile, or None if missing or older than the TTL."""
+        path = self._path(tile)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with gzip.open(path, "rt", encoding="utf8") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return [{"name": n, "lat": la, "lon": lo, "tags": tags} for n, la, lo, tags in rows]
+
+    def put(self, tile: Tile, pois: List[Dict]):
+        path = self._path(tile)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        rows = [[p["name"], p["lat"], p["lon"], p.get("tags", {})] for p in pois]
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf8") as f:
+            json.dump(rows, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def lookup(self, tiles: List[Tile]) -> Tuple[List[Dict], List[Tile]]:
+        """Return (POIs from fresh cached tiles, tiles that must be fetched)."""
+        pois, missing = [], []
+        for tile in tiles:
+            cached = self.get(tile)
+            if cached is None:
+                self.misses += 1
+                missing.append(tile)
+            else:
+                self.hits += 1
+                pois.extend(cached)
+        return pois, missing
+
+    def store(self, tiles: List[Tile], pois: List[Dict]) -> List[Dict]:
+        """Split freshly fetched POIs into `tiles` and persist them.
+
+        POIs whose coordinate falls outside `tiles` are discarded (they belong
+        to a tile that is cached or fetched separately). Returns the kept POIs.
+        """
+        buckets: Dict[Tile, List[Dict]] = {t: [] for t in tiles}
+        for p in pois:
+            tile = self.tile_of(p["lat"], p["lon"])
+            if tile in buckets:
+                buckets[tile].append(p)
+        kept = []
+        for tile, items in buckets.items():
+            self.put(tile, items)
+            kept.extend(items)
+        return kept
@@ -1,6 +1,8 @@
 import random
 from typing import Tuple
 
+from utils.geoutils import haversine_m
+
 
 def get_mock_gps(center: Tuple[float, float] = (48.8584, 2.2945), radius_m: float = 5000) -> Tuple[float, float]:
     """Return a mock GPS coordinate near a given center (lat, lon).
@@ -25,15 +27,5 @@ def get_mock_gps(center: Tuple[float, float] = (48.8584, 2.2945), radius_m: floa
 
 
 def haversine_distance(lat1, lon1, lat2, lon2):
-    """Return distance in meters between two lat/lon pairs."""
-    import math
-
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    """Return distance in meters between two lat/lon pairs (scalars or arrays)."""
+    return haversine_m(lat1, lon1, lat2, lon2)
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from data_fetcher import fetch_info
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+
+def describe_match(match: Optional[Dict], info_fn: Callable[[str], Dict], sim_threshold: float) -> Tuple[str, bool]:
+    """Build the overlay text for a match result.
+
+    Returns `(text, pending)`; `pending` is True when `info_fn` only had a
+    placeholder description so far (see `InfoService.lookup`).
+    """
+    if match and match.get("similarity", 0) >= sim_threshold:
+        with instrument.span("info_lookup"):
+            info = info_fn(match["poi"]["name"])
+        return f"{info.get('name')} - {(info.get('description') or '')[:200]}", bool(info.get("pending"))
+    if match:
+        return f"{match['poi'].get('name')} (low confidence)", False
+    return "No match", False
+
+
+class InferenceWorker:
+    """Run `MatchEngine.match_frame` and the info lookup off the render thread.
+
+    The worker holds a single pending slot: `submit` replaces any frame that
+    has not been picked up yet, so inference never queues up behind a slow
+    model and always runs on the most recent frame. Completed results are
+    published with the frame id and capture timestamp; the render loop polls
+    `latest()` and keeps drawing at source FPS. A result whose description
+    was still being prefetched is looked up again by `latest()` until the
+    real text is available.
+
+    Usage:
+        with InferenceWorker(engine) as worker:
+            for i, frame in enumerate(stream.frames()):
+                worker.submit(frame, frame_id=i)
+                result = worker.latest()
+    """
+
+    def __init__(self, engine, info_fn: Callable[[str], Dict] = fetch_info, sim_threshold: float = 0.5):
+        self.engine = engine
+        self.info_fn = info_fn
+        self.sim_threshold = sim_threshold
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._latest = None
+        self._busy = False
+        self._stop = False
+        self._thread = None
+
+        self.submitted = 0
+        self.replaced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    @property
+    def busy(self) -> bool:
+        """True while a frame is being processed or waiting to be."""
+        with self._cond:
+            return self._busy or self._pending is not None
+
+    def submit(self, frame, frame_id: Optional[int] = None, timestamp: Optional[float] = None) -> bool:
+        """Offer a frame for inference. Returns False if it replaced a pending one.
+
+        The caller must not modify `frame` afterwards (pass a copy if the
+        render loop draws on it).
+        """
+        with self._cond:
+            dropped = self._pending is not None
+            if dropped:
+                self.replaced += 1
+            self.submitted += 1
+            self._pending = (frame, frame_id, timestamp if timestamp is not None else time.time())
+            self._cond.notify_all()
+        return not dropped
+
+    def latest(self) -> Optional[Dict]:
+        """Return the most recent completed result, or None before the first one."""
+        with self._cond:
+            result = self._latest
+        if result is None or not result["info_pending"]:
+            return result
+        text, pending = describe_match(result["match"], self.info_fn, self.sim_threshold)
+        if pending:
+            return result
+        updated = dict(result, display_text=text, info_pending=False)
+        with self._cond:
+            if self._latest is result:
+                self._latest = updated
+            return self._latest
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "replaced": self.replaced,
+                "completed": self.completed,
+                "failed": self.failed,
+                "busy": self._busy,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                frame, frame_id, timestamp = self._pending
+                self._pending = None
+                self._busy = True
+
+            started = time.time()
+            try:
+                with instrument.span("inference"):
+                    match = self.engine.match_frame(frame)
+                    text, info_pending = describe_match(match, self.info_fn, self.sim_threshold)
+            except Exception as e:
+                logger.error("Inference failed for frame %s: %s", frame_id, e)
+                with self._cond:
+                    self.failed += 1
+                    self._busy = False
+                continue
+
+            finished = time.time()
+            result = {
+                "frame_id": frame_id,
+                "timestamp": timestamp,
+                "completed_at": finished,
+                "latency": finished - started,
+                "match": match,
+                "display_text": text,
+                "info_pending": info_pending,
+            }
+            with self._cond:
+                self._latest = result
+                self.completed += 1
+                self._busy = False
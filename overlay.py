@@ -1,20 +1,143 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
 import cv2
+import numpy as np
 
+from utils import instrument
 
-def draw_overlay(frame, text: str, score: float = None):
-    """Draw a simple overlay with the monument name and optional score.
 
-    Currently places text in the top-left corner.
+class OverlayRenderer:
+    """Draws the result banner from a cache of pre-rasterized banners.
+
+    A banner (title with optional score, plus optional extra lines such as a
+    description) is rendered with anti-aliased text once per distinct
+    content and frame width, and kept in a small LRU cache. Each frame then
+    costs a single ROI copy (or one weighted blend when `opacity` < 1).
+    With `out`, the frame is composed into a preallocated buffer and the
+    source frame is left untouched. `hud` lines (e.g. profiling stats from
+    `utils.instrument.hud_lines()`) are drawn in a panel at the bottom; the
+    panel is re-rasterized only when its text changes.
+
+    Usage:
+        renderer = OverlayRenderer()
+        canvas = None
+        for frame in stream.frames():
+            if canvas is None:
+                canvas = frame.copy()
+            renderer.render(frame, "Eiffel Tower", score=0.83, out=canvas)
     """
-    h, w = frame.shape[:2]
-    # rectangle background
-    overlay_h = 60
-    cv2.rectangle(frame, (0, 0), (w, overlay_h), (0, 0, 0), thickness=-1)
 
-    title = text
-    if score is not None:
-        title = f"{text} ({score:.2f})"
+    def __init__(
+        self,
+        # rows 0..60 inclusive, as the former filled cv2.rectangle drew them
+        title_height: int = 61,
+        line_height: int = 26,
+        hud_line_height: int = 18,
+        max_banners: int = 32,
+        opacity: float = 1.0,
+        font=cv2.FONT_HERSHEY_SIMPLEX,
+    ):
+        self.title_height = title_height
+        self.line_height = line_height
+        self.hud_line_height = hud_line_height
+        self.max_banners = max_banners
+        self.opacity = opacity
+        self.font = font
+        self._banners: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._hud_key: Optional[tuple] = None
+        self._hud: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _rasterize(self, title: str, lines: Sequence[str], width: int) -> np.ndarray:
+        height = self.title_height + self.line_height * len(lines)
+        banner = np.zeros((height, width, 3), dtype=np.uint8)
+        cv2.putText(banner, title, (8, 30), self.font, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+        for i, line in enumerate(lines):
+            y = self.title_height + self.line_height * i + 14
+            cv2.putText(banner, line, (8, y), self.font, 0.6, (220, 220, 220), 1, cv2.LINE_AA)
+        return banner
+
+    def banner(self, text: str, score: Optional[float] = None, lines: Sequence[str] = (), width: int = 640) -> np.ndarray:
+        """The cached banner for this content, rasterized on first use."""
+        title = text if score is None else f"{text} ({score:.2f})"
+        key = (title, tuple(lines), width)
+        banner = self._banners.get(key)
+        if banner is not None:
+            self._banners.move_to_end(key)
+            self.hits += 1
+            return banner
+        self.misses += 1
+        banner = self._rasterize(title, lines, width)
+        self._banners[key] = banner
+        if len(self._banners) > self.max_banners:
+            self._banners.popitem(last=False)
+            self.evictions += 1
+        return banner
+
+    def hud_panel(self, lines: Sequence[str], width: int) -> np.ndarray:
+        """The stats panel for `lines`, kept until the text changes."""
+        key = (tuple(lines), width)
+        if key != self._hud_key:
+            panel = np.zeros((self.hud_line_height * len(lines) + 8, width, 3), dtype=np.uint8)
+            for i, line in enumerate(lines):
+                y = self.hud_line_height * (i + 1)
+                cv2.putText(panel, line, (8, y), self.font, 0.45, (0, 255, 255), 1, cv2.LINE_AA)
+            self._hud_key, self._hud = key, panel
+        return self._hud
+
+    @instrument.timed("overlay")
+    def render(self, frame: np.ndarray, text: str, score: Optional[float] = None, bbox=None,
+               lines: Sequence[str] = (), out: Optional[np.ndarray] = None,
+               hud: Sequence[str] = ()) -> np.ndarray:
+        """Compose the overlay onto `out` (or `frame` itself when `out` is None)."""
+        h, w = frame.shape[:2]
+        banner = self.banner(text, score, lines, w)
+        rows = min(banner.shape[0], h)
+        if out is None:
+            out = frame
+        elif out is not frame:
+            if out.shape != frame.shape:
+                raise ValueError(f"Output buffer {out.shape} does not match frame {frame.shape}")
+            if self.opacity >= 1.0:
+                # the banner rows are overwritten anyway
+                out[rows:] = frame[rows:]
+            else:
+                out[...] = frame
+
+        roi = out[:rows]
+        if self.opacity >= 1.0:
+            roi[...] = banner[:rows]
+        else:
+            cv2.addWeighted(roi, 1.0 - self.opacity, banner[:rows], self.opacity, 0.0, dst=roi)
 
-    cv2.putText(frame, title, (8, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2, cv2.LINE_AA)
+        if bbox is not None:
+            x, y, bw, bh = bbox
+            cv2.rectangle(out, (x, y), (x + bw, y + bh), (0, 255, 0), 2)
 
-    return frame
+        if hud:
+            panel = self.hud_panel(hud, w)
+            hud_rows = min(panel.shape[0], h - rows)
+            if hud_rows > 0:
+                out[h - hud_rows:] = panel[:hud_rows]
+        return out
+
+    def stats(self) -> Dict:
+        return {"banners": len(self._banners), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+
+_default_renderer = OverlayRenderer()
+
+
+def draw_overlay(frame, text: str, score: float = None, bbox=None, lines: List[str] = (), out=None, hud: List[str] = ()):
+    """Draw a simple overlay with the monument name and optional score.
+
+    Currently places text in the top-left corner. `bbox` (x, y, w, h) outlines
+    the tracked monument. Draws on `frame` unless a preallocated `out` buffer
+    is given; banners are cached by the shared `OverlayRenderer`. `hud` lines
+    are shown in a stats panel at the bottom.
+    """
+    return _default_renderer.render(frame, text, score=score, bbox=bbox, lines=lines, out=out, hud=hud)
@@ -0,0 +1,339 @@
+"""Local HTTP streaming of match results and annotated frames.
+
+An asyncio server running on its own thread, with no dependency beyond
+OpenCV. The capture loop calls `publish_event` / `publish_frame`, which
+never block; clients on the same machine (or behind an adb/USB reverse
+port for a phone) connect to:
+
+    GET /events       Server-Sent Events, one compact JSON object per result
+    GET /stream.mjpg  multipart/x-mixed-replace JPEG stream
+    GET /latest.json  last event
+    GET /             small viewer page
+
+Frames are JPEG-encoded once in a thread pool, only while a frame client is
+connected and at most `max_fps` times per second, then fanned out. Every
+client has its own bounded queue that drops the oldest item when the client
+falls behind, so a slow consumer never stalls the others or the capture
+loop.
+
+    with StreamServer(port=8765) as server:
+        server.publish_event({"type": "match", "poi": "Eiffel Tower"})
+        server.publish_frame(frame, frame_id=42)
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+INDEX_HTML = b"""<!doctype html>
+<html><head><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>AR Monument Recognition</title></head>
+<body style="margin:0;background:#000;color:#fff;font-family:sans-serif">
+<img src="/stream.mjpg" style="width:100%">
+<pre id="ev" style="padding:8px;white-space:pre-wrap"></pre>
+<script>
+new EventSource("/events").onmessage = e => {
+  document.getElementById("ev").textContent = JSON.stringify(JSON.parse(e.data), null, 1);
+};
+</script></body></html>
+"""
+
+
+def match_event(result: Dict, track: Optional[Dict] = None) -> Dict:
+    """Compact JSON event for an `InferenceWorker` result (and tracking state)."""
+    match = result.get("match") or {}
+    poi = match.get("poi") or {}
+    event = {
+        "type": "match",
+        "frame_id": result.get("frame_id"),
+        "timestamp": result.get("timestamp"),
+        "latency": round(result.get("latency", 0.0), 4),
+        "poi": poi.get("name"),
+        "wikidata": poi.get("tags", {}).get("wikidata"),
+        "lat": poi.get("lat"),
+        "lon": poi.get("lon"),
+        "similarity": round(match["similarity"], 4) if "similarity" in match else None,
+        "margin": round(match["margin"], 4) if match.get("margin") is not None else None,
+        "text": result.get("display_text"),
+    }
+    if track is not None:
+        event["state"] = track.get("state")
+        event["bbox"] = list(track["bbox"]) if track.get("bbox") else None
+    return event
+
+
+class _Client:
+    def __init__(self, kind: str, queue_size: int):
+        self.kind = kind
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.last_seq = -1
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+
+class StreamServer:
+    """Asyncio HTTP server pushing JSON events (SSE) and JPEG frames (MJPEG).
+
+    Binds to localhost by default. `publish_*` may be called from any
+    thread; `stats()` reports connected clients and sent/dropped items.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        jpeg_quality: int = 80,
+        max_fps: float = 15.0,
+        frame_queue_size: int = 2,
+        event_queue_size: int = 64,
+        encode_workers: int = 2,
+    ):
+        self.host = host
+        self.port = port
+        self.jpeg_quality = jpeg_quality
+        self.max_fps = max_fps
+        self.frame_queue_size = frame_queue_size
+        self.event_queue_size = event_queue_size
+        self.encode_workers = encode_workers
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._server = None
+        self._ready = threading.Event()
+        # set by the server thread when binding fails, re-raised by start()
+        self._start_error: Optional[BaseException] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._encode_slots: Optional[asyncio.Semaphore] = None
+        self._clients = set()
+        # read from the publishing thread to skip work when nobody watches
+        self._frame_clients = 0
+        self._last_frame_time = 0.0
+        self._frame_seq = 0
+        self._last_event: Optional[bytes] = None
+
+        self.frames_offered = 0
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+        self.events_published = 0
+
+    # --------------------------------------------------------------- lifecycle
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> "StreamServer":
+        if self._thread is not None:
+            return self
+        self._pool = ThreadPoolExecutor(max_workers=self.encode_workers, thread_name_prefix="jpeg")
+        self._thread = threading.Thread(target=self._run, name="stream-server", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=5.0):
+            self.stop()
+            raise RuntimeError(f"Stream server on {self.host}:{self.port} did not start within 5s")
+        if self._start_error is not None:
+            error, self._start_error = self._start_error, None
+            self._thread.join(timeout=5.0)
+            self._abandon()
+            raise error
+        logger.info("Streaming on http://%s:%d/", self.host, self.port)
+        return self
+
+    def _abandon(self):
+        self._thread = None
+        self._loop = None
+        self._ready.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self._abandon()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._encode_slots = asyncio.Semaphore(self.encode_workers)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+            # port 0 picks a free port
+            self.port = self._server.sockets[0].getsockname()[1]
+        except Exception as e:
+            # e.g. the port is busy: start() re-raises it on the caller's thread
+            self._start_error = e
+            self._loop.close()
+            return
+        finally:
+            self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            for task in asyncio.all_tasks(self._loop):
+                task.cancel()
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    # -------------------------------------------------------------- publishing
+    def publish_event(self, event: Dict):
+        """Send a JSON-serializable event to every /events client."""
+        if self._loop is None:
+            return
+        data = json.dumps(event, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf8")
+        self.events_published += 1
+        self._loop.call_soon_threadsafe(self._fanout_event, data)
+
+    def publish_frame(self, frame: np.ndarray, frame_id: Optional[int] = None) -> bool:
+        """Offer a BGR frame to /stream.mjpg clients. Returns True if it will be sent.
+
+        The frame is copied only when it is accepted, so callers may keep
+        drawing into a reused buffer.
+        """
+        self.frames_offered += 1
+        now = time.perf_counter()
+        if (self._loop is None or self._frame_clients == 0
+                or (self.max_fps > 0 and now - self._last_frame_time < 1.0 / self.max_fps)):
+            self.frames_skipped += 1
+            return False
+        self._last_frame_time = now
+        self._frame_seq += 1
+        self._loop.call_soon_threadsafe(self._schedule_encode, frame.copy(), self._frame_seq)
+        return True
+
+    def _fanout_event(self, data: bytes):
+        self._last_event = data
+        for client in self._clients:
+            if client.kind == "events":
+                client.offer(data)
+
+    def _schedule_encode(self, frame: np.ndarray, seq: int):
+        self._loop.create_task(self._encode_and_fanout(frame, seq))
+
+    def _encode(self, frame: np.ndarray) -> Optional[bytes]:
+        with instrument.span("jpeg_encode"):
+            ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buf.tobytes() if ok else None
+
+    async def _encode_and_fanout(self, frame: np.ndarray, seq: int):
+        async with self._encode_slots:
+            jpeg = await self._loop.run_in_executor(self._pool, self._encode, frame)
+        if jpeg is None:
+            return
+        self.frames_encoded += 1
+        for client in self._clients:
+            # encodes may finish out of order: never send an older frame
+            if client.kind == "frames" and seq > client.last_seq:
+                client.last_seq = seq
+                client.offer(jpeg)
+
+    # ------------------------------------------------------------------- HTTP
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10.0)
+            parts = head.split(b"\r\n", 1)[0].decode("latin1").split()
+            method, path = (parts[0], parts[1].split("?", 1)[0]) if len(parts) >= 2 else ("", "")
+            if method != "GET":
+                await self._respond(writer, 405, b"method not allowed", "text/plain")
+            elif path == "/events":
+                await self._serve_events(writer)
+            elif path == "/stream.mjpg":
+                await self._serve_frames(writer)
+            elif path == "/latest.json":
+                await self._respond(writer, 200, self._last_event or b"{}", "application/json")
+            elif path == "/":
+                await self._respond(writer, 200, INDEX_HTML, "text/html; charset=utf-8")
+            else:
+                await self._respond(writer, 404, b"not found", "text/plain")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError,
+                ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status: int, body: bytes, content_type: str):
+        reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nAccess-Control-Allow-Origin: *\r\n"
+            f"Connection: close\r\n\r\n".encode("latin1") + body
+        )
+        await writer.drain()
+
+    def _connect(self, kind: str, queue_size: int) -> _Client:
+        client = _Client(kind, queue_size)
+        self._clients.add(client)
+        if kind == "frames":
+            self._frame_clients += 1
+        return client
+
+    def _disconnect(self, client: _Client):
+        self._clients.discard(client)
+        if client.kind == "frames":
+            self._frame_clients -= 1
+
+    async def _serve_events(self, writer: asyncio.StreamWriter):
+        client = self._connect("events", self.event_queue_size)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                         b"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\nretry: 1000\n\n")
+            if self._last_event is not None:
+                client.offer(self._last_event)
+            while True:
+                try:
+                    data = await asyncio.wait_for(client.queue.get(), timeout=15.0)
+                    writer.write(b"data: " + data + b"\n\n")
+                    client.sent += 1
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                await writer.drain()
+        finally:
+            self._disconnect(client)
+
+    async def _serve_frames(self, writer: asyncio.StreamWriter):
+        client = self._connect("frames", self.frame_queue_size)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            while True:
+                jpeg = await client.queue.get()
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                await writer.drain()
+                client.sent += 1
+        finally:
+            self._disconnect(client)
+
+    def stats(self) -> Dict:
+        clients = list(self._clients)
+        return {
+            "event_clients": sum(1 for c in clients if c.kind == "events"),
+            "frame_clients": sum(1 for c in clients if c.kind == "frames"),
+            "events_published": self.events_published,
+            "frames_offered": self.frames_offered,
+            "frames_encoded": self.frames_encoded,
+            "frames_skipped": self.frames_skipped,
+            "client_drops": sum(c.dropped for c in clients),
+        }
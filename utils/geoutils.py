@@ -1,12 +1,181 @@
 import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters.
+
+    Accepts scalars or NumPy arrays (broadcast against each other) and returns
+    a float for scalar input, an array otherwise. NaN coordinates give NaN.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    d = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return float(d) if np.ndim(d) == 0 else d
 
 
 def haversine_km(lat1, lon1, lat2, lon2):
-    R = 6371.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    d = haversine_m(lat1, lon1, lat2, lon2)
+    return d / 1000.0
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial bearing from point 1 to point 2, in degrees clockwise from north [0, 360).
+
+    Vectorized like `haversine_m`.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dlambda = np.radians(np.subtract(lon2, lon1))
+    x = np.sin(dlambda) * np.cos(phi2)
+    y = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlambda)
+    b = np.degrees(np.arctan2(x, y)) % 360.0
+    return float(b) if np.ndim(b) == 0 else b
+
+
+def angle_diff_deg(a, b):
+    """Absolute difference between bearings `a` and `b` in degrees [0, 180] (vectorized)."""
+    d = np.abs((np.subtract(a, b) + 180.0) % 360.0 - 180.0)
+    return float(d) if np.ndim(d) == 0 else d
+
+
+class HeadingEstimator:
+    """Camera heading from a compass, or derived from consecutive GPS fixes.
+
+    A compass reading is used as is. Without one, the heading is the
+    bearing of the movement since the last fix that was at least
+    `min_move_m` away (smaller moves are mostly GPS jitter), smoothed on
+    the circle with weight `smoothing` for the previous estimate. The
+    heading stays None until the camera has moved far enough once.
+
+    Usage:
+        headings = HeadingEstimator()
+        heading = headings.update(lat, lon)              # from the track
+        heading = headings.update(lat, lon, compass=87)  # from a compass
+    """
+
+    def __init__(self, min_move_m: float = 5.0, smoothing: float = 0.5):
+        self.min_move_m = min_move_m
+        self.smoothing = smoothing
+        self.heading: Optional[float] = None
+        self._anchor: Optional[Tuple[float, float]] = None
+
+    def update(self, lat: float, lon: float, compass: Optional[float] = None) -> Optional[float]:
+        if compass is not None:
+            self.heading = float(compass) % 360.0
+            self._anchor = (lat, lon)
+            return self.heading
+        if self._anchor is None:
+            self._anchor = (lat, lon)
+            return self.heading
+        if haversine_m(self._anchor[0], self._anchor[1], lat, lon) < self.min_move_m:
+            return self.heading
+        bearing = bearing_deg(self._anchor[0], self._anchor[1], lat, lon)
+        self._anchor = (lat, lon)
+        if self.heading is None:
+            self.heading = bearing
+        else:
+            # weighted mean of unit vectors, so 350 and 10 average to 0
+            w = self.smoothing
+            x = w * math.sin(math.radians(self.heading)) + (1 - w) * math.sin(math.radians(bearing))
+            y = w * math.cos(math.radians(self.heading)) + (1 - w) * math.cos(math.radians(bearing))
+            self.heading = math.degrees(math.atan2(x, y)) % 360.0
+        return self.heading
+
+
+def poi_coordinates(pois: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """(lats, lons) float arrays of POI dicts; missing coordinates become NaN."""
+    lats = np.array([p["lat"] if p.get("lat") is not None else np.nan for p in pois], dtype=np.float64)
+    lons = np.array([p["lon"] if p.get("lon") is not None else np.nan for p in pois], dtype=np.float64)
+    return lats, lons
+
+
+class GridIndex:
+    """Uniform-grid spatial index over lat/lon points for radius and k-nearest queries.
+
+    Points are bucketed into square cells of roughly `cell_m` meters
+    (equirectangular approximation around the mean latitude). A query only
+    computes exact haversine distances for the points in the cells overlapping
+    the query circle, so radius filtering over city-scale sets (10k+ POIs)
+    stays in the millisecond range. Points with NaN coordinates are ignored.
+
+    Usage:
+        index = GridIndex(lats, lons, cell_m=500)
+        idx, dist = index.query_radius(lat, lon, 1000)   # sorted by distance
+        idx, dist = index.query_knn(lat, lon, k=10)
+    """
+
+    def __init__(self, lats, lons, cell_m: float = 500.0):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_m = cell_m
+
+        valid = ~(np.isnan(self.lats) | np.isnan(self.lons))
+        ref_lat = float(np.mean(self.lats[valid])) if valid.any() else 0.0
+        self._deg_lat = cell_m / 111_000.0
+        self._deg_lon = cell_m / max(1e-6, 111_000.0 * math.cos(math.radians(ref_lat)))
+
+        # bucket valid points by cell: sort by cell key, keep the slice bounds per key
+        ids = np.nonzero(valid)[0]
+        ci = np.floor(self.lats[ids] / self._deg_lat).astype(np.int64)
+        cj = np.floor(self.lons[ids] / self._deg_lon).astype(np.int64)
+        order = np.lexsort((cj, ci))
+        self._ids = ids[order]
+        ci, cj = ci[order], cj[order]
+        self._cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        if len(self._ids):
+            breaks = np.nonzero((np.diff(ci) != 0) | (np.diff(cj) != 0))[0] + 1
+            starts = np.concatenate(([0], breaks))
+            ends = np.concatenate((breaks, [len(self._ids)]))
+            for s, e in zip(starts, ends):
+                self._cells[(int(ci[s]), int(cj[s]))] = (int(s), int(e))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _candidates(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        dlat = radius_m / 111_000.0
+        dlon = radius_m / max(1e-6, 111_000.0 * math.cos(math.radians(lat)))
+        i0 = math.floor((lat - dlat) / self._deg_lat)
+        i1 = math.floor((lat + dlat) / self._deg_lat)
+        j0 = math.floor((lon - dlon) / self._deg_lon)
+        j1 = math.floor((lon + dlon) / self._deg_lon)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            # query wider than the data: scanning every cell is cheaper
+            return self._ids
+        chunks = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                bounds = self._cells.get((i, j))
+                if bounds is not None:
+                    chunks.append(self._ids[bounds[0]:bounds[1]])
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    def query_radius(self, lat: float, lon: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of points within `radius_m` of (lat, lon) and their distances, nearest first."""
+        cand = self._candidates(lat, lon, radius_m)
+        d = haversine_m(lat, lon, self.lats[cand], self.lons[cand])
+        keep = d <= radius_m
+        cand, d = cand[keep], d[keep]
+        order = np.argsort(d, kind="stable")
+        return cand[order], d[order]
+
+    def query_knn(self, lat: float, lon: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The `k` nearest points to (lat, lon) and their distances, nearest first."""
+        k = min(k, len(self._ids))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        radius = self.cell_m
+        while True:
+            idx, d = self.query_radius(lat, lon, radius)
+            # every point closer than `radius` is found, so the k nearest are exact
+            if len(idx) >= k or radius > 2 * math.pi * EARTH_RADIUS_M:
+                return idx[:k], d[:k]
+            radius *= 2
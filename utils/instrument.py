@@ -0,0 +1,279 @@
+"""Lightweight spans, counters and histograms for profiling the pipeline.
+
+Instrumentation is off by default and then costs one global check per
+span. When enabled, every span records its duration into a log-bucketed
+histogram (8 buckets per octave, so percentiles are within ~5%), and with
+`trace=True` also into a bounded Chrome trace timeline that can be opened
+in chrome://tracing or https://ui.perfetto.dev.
+
+Usage:
+    from utils import instrument
+
+    instrument.enable(trace=True)
+    with instrument.span("clip_forward"):
+        model(x)
+    instrument.count("frames")
+    print(instrument.snapshot())
+    instrument.write_trace("trace.json")
+
+Setting MONUMENT_PROFILE=1 enables it at import time; MONUMENT_TRACE=path
+also records the timeline and writes it to `path` at exit.
+
+Modules log through `logging.getLogger(__name__)`; entry points call
+`configure_logging` once (level from MONUMENT_LOG_LEVEL, default INFO).
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from functools import wraps
+from typing import Dict, List, Optional
+
+_BUCKETS_PER_OCTAVE = 8
+_NUM_BUCKETS = 64 * _BUCKETS_PER_OCTAVE
+
+enabled = False
+_tracing = False
+_max_trace_events = 1_000_000
+_trace: List[tuple] = []
+_trace_dropped = 0
+_histograms: Dict[str, "Histogram"] = {}
+_counters: Dict[str, int] = {}
+_lock = threading.Lock()
+_origin_ns = time.perf_counter_ns()
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+class Histogram:
+    """Log-bucketed latency histogram (nanoseconds in, milliseconds out)."""
+
+    __slots__ = ("name", "counts", "count", "total_ns", "max_ns", "_lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def record(self, ns: int):
+        idx = int(math.log2(ns) * _BUCKETS_PER_OCTAVE) if ns > 1 else 0
+        with self._lock:
+            self.counts[min(idx, _NUM_BUCKETS - 1)] += 1
+            self.count += 1
+            self.total_ns += ns
+            if ns > self.max_ns:
+                self.max_ns = ns
+
+    def percentile(self, q: float) -> float:
+        """Approximate `q`-th percentile (0..100) in milliseconds."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                # geometric middle of the bucket, capped by the exact max
+                ns = 2.0 ** ((idx + 0.5) / _BUCKETS_PER_OCTAVE)
+                return min(ns, self.max_ns) / 1e6
+        return self.max_ns / 1e6
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ns / 1e6, 3),
+            "mean_ms": round(self.total_ns / self.count / 1e6, 4) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 4),
+            "p90_ms": round(self.percentile(90), 4),
+            "p99_ms": round(self.percentile(99), 4),
+            "max_ms": round(self.max_ns / 1e6, 4),
+        }
+
+
+def _histogram(name: str) -> Histogram:
+    h = _histograms.get(name)
+    if h is None:
+        with _lock:
+            h = _histograms.setdefault(name, Histogram(name))
+    return h
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _record(self.name, self.start, end - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _record(name: str, start_ns: int, dur_ns: int):
+    global _trace_dropped
+    _histogram(name).record(dur_ns)
+    if _tracing:
+        if len(_trace) < _max_trace_events:
+            _trace.append((name, start_ns, dur_ns, threading.get_ident()))
+        else:
+            _trace_dropped += 1
+
+
+def span(name: str):
+    """Context manager timing the enclosed block under `name`."""
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name: str):
+    """Decorator form of `span`."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name: str, seconds: float, start: Optional[float] = None):
+    """Add an externally measured duration (perf_counter seconds) to `name`."""
+    if not enabled:
+        return
+    start_ns = int(start * 1e9) if start is not None else time.perf_counter_ns() - int(seconds * 1e9)
+    _record(name, start_ns, int(seconds * 1e9))
+
+
+def count(name: str, n: int = 1):
+    """Increment counter `name` by `n`."""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def enable(trace: bool = False, max_trace_events: int = 1_000_000):
+    """Start collecting; with `trace` also keep a timeline of every span."""
+    global enabled, _tracing, _max_trace_events
+    _max_trace_events = max_trace_events
+    _tracing = trace
+    enabled = True
+
+
+def disable():
+    global enabled, _tracing
+    enabled = False
+    _tracing = False
+
+
+def reset():
+    """Drop all collected histograms, counters and trace events."""
+    global _trace_dropped
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _trace.clear()
+        _trace_dropped = 0
+
+
+def snapshot() -> Dict:
+    """Per-span latency summaries and counter values."""
+    with _lock:
+        hists = dict(_histograms)
+        counters = dict(_counters)
+    return {
+        "spans": {name: h.summary() for name, h in sorted(hists.items())},
+        "counters": dict(sorted(counters.items())),
+        "trace_events": len(_trace),
+        "trace_dropped": _trace_dropped,
+    }
+
+
+def hud_lines(max_lines: int = 8) -> List[str]:
+    """Short text lines for an on-screen stats panel, busiest spans first."""
+    with _lock:
+        hists = list(_histograms.values())
+    hists.sort(key=lambda h: h.total_ns, reverse=True)
+    lines = []
+    for h in hists[:max_lines]:
+        lines.append(f"{h.name:<20} p50 {h.percentile(50):7.2f} ms  p99 {h.percentile(99):7.2f} ms  n={h.count}")
+    return lines
+
+
+def format_table() -> str:
+    """The snapshot as a text table, for end-of-run reports."""
+    snap = snapshot()
+    rows = [f"{'span':<24}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for name, s in snap["spans"].items():
+        rows.append(f"{name:<24}{s['count']:>8}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}"
+                    f"{s['p90_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['max_ms']:>10.3f}")
+    for name, value in snap["counters"].items():
+        rows.append(f"{name:<24}{value:>8}")
+    return "\n".join(rows)
+
+
+def configure_logging(level=None):
+    """Set up root logging for a command-line entry point."""
+    level = level or os.environ.get("MONUMENT_LOG_LEVEL", "INFO")
+    if isinstance(level, str):
+        level = level.upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    # keep HTTP client chatter out of INFO output
+    logging.getLogger("urllib3").setLevel(max(logging.WARNING, logging.getLogger().level))
+
+
+def write_trace(path: str) -> int:
+    """Write the recorded timeline as Chrome trace JSON. Returns the event count."""
+    pid = os.getpid()
+    events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "monument-ar"}}]
+    threads = {}
+    for name, start_ns, dur_ns, tid in list(_trace):
+        threads.setdefault(tid, len(threads))
+        events.append({
+            "name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": pid, "tid": tid,
+            "ts": (start_ns - _origin_ns) / 1000.0, "dur": dur_ns / 1000.0,
+        })
+    names = {t.ident: t.name for t in threading.enumerate()}
+    for tid in threads:
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                       "args": {"name": names.get(tid, str(tid))}})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    os.replace(tmp, path)
+    return len(events)
+
+
+if os.environ.get("MONUMENT_PROFILE") or os.environ.get("MONUMENT_TRACE"):
+    _trace_path = os.environ.get("MONUMENT_TRACE")
+    enable(trace=bool(_trace_path))
+    if _trace_path:
+        atexit.register(write_trace, _trace_path)
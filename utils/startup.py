@@ -0,0 +1,63 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Wall-clock breakdown of application start-up.
+
+    Phases are timed relative to the report's creation, so work running in
+    the background (e.g. the CLIP warm-up thread) shows up overlapping the
+    foreground phases.
+
+    Usage:
+        report = StartupReport()
+        with report.phase("poi retrieval"):
+            pois = get_nearby_pois(lat, lon)
+        report.add("model load (background)", clip.load_started, clip.load_seconds)
+        report.print()
+    """
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.phases: List[Dict] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start)
+
+    def add(self, name: str, started: Optional[float], seconds: Optional[float]):
+        """Record a phase measured elsewhere (perf_counter start and duration)."""
+        if started is None or seconds is None:
+            return
+        self.phases.append({"name": name, "start": started - self.origin, "seconds": seconds})
+
+    def summary(self) -> Dict:
+        end = max((p["start"] + p["seconds"] for p in self.phases), default=0.0)
+        busy = sum(p["seconds"] for p in self.phases)
+        return {
+            "phases": sorted(self.phases, key=lambda p: p["start"]),
+            "wall_seconds": end,
+            "phase_seconds": busy,
+        }
+
+    def format(self) -> str:
+        """The breakdown as a text table."""
+        s = self.summary()
+        rows = ["Startup breakdown:"]
+        for p in s["phases"]:
+            rows.append(f"  {p['name']:<32} +{p['start']:6.2f}s  {p['seconds']:6.2f}s")
+        rows.append(f"  {'ready after':<32} {s['wall_seconds']:7.2f}s  "
+                    f"({s['phase_seconds']:.2f}s of phases, overlapping where concurrent)")
+        return "\n".join(rows)
+
+    def print(self):
+        """Log the breakdown (INFO)."""
+        logger.info("%s", self.format())
@@ -1,13 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
 import requests
 
+from utils import instrument
 
-def fetch_summary(title: str, sentences: int = 2) -> str:
+logger = logging.getLogger(__name__)
+
+SUMMARY_URL = "https://en.wikipedia.org/api/rest_v1/page/summary/{}"
+DEFAULT_SUMMARY_CACHE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "wikipedia_summaries.json")
+
+
+def request_summary(title: str, timeout: float = 6, session=None, url: str = SUMMARY_URL) -> Optional[Dict]:
+    """Query the Wikipedia REST summary of `title`.
+
+    Returns {"title", "extract"}, {} if the page does not exist, or None
+    when the request failed (network error, throttling, server error).
+    """
     try:
-        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{requests.utils.quote(title)}"
-        r = requests.get(url, timeout=6)
-        if r.status_code == 200:
-            data = r.json()
-            return data.get("extract", "")
+        with instrument.span("net.wikipedia_summary"):
+            r = (session or requests).get(url.format(requests.utils.quote(title)), timeout=timeout)
     except Exception:
-        pass
-    return ""
+        return None
+    if r.status_code == 200:
+        try:
+            data = r.json()
+        except ValueError:
+            return None
+        return {"title": data.get("title", title), "extract": data.get("extract", "")}
+    if r.status_code == 404:
+        return {}
+    return None
+
+
+class SummaryCache:
+    """Persistent LRU + TTL cache of Wikipedia summaries.
+
+    Missing pages are cached too (negative entries, with their own shorter
+    TTL) so they are not queried again on every lookup; failed requests are
+    not cached. Entries live in memory in LRU order and are written to a
+    JSON file with `flush()` (atomic replace).
+
+    Usage:
+        cache = SummaryCache()
+        entry = cache.get("Eiffel Tower")        # cached only, never blocks
+        entry = cache.fetch("Eiffel Tower")      # network on miss
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_SUMMARY_CACHE,
+        max_entries: int = 5000,
+        ttl_seconds: float = 30 * 24 * 3600,
+        negative_ttl_seconds: float = 24 * 3600,
+        timeout: float = 6,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        # serializes writers of the shared temp file; snapshots are taken under
+        # it too, so a newer snapshot is never overwritten by an older one
+        self._flush_lock = threading.Lock()
+        # title -> {"title", "extract", "found", "fetched_at"}
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._dirty = False
+        self._session = requests.Session()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf8") as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.warning("Wikipedia summary cache at %s is unreadable, starting empty: %s", self.path, e)
+            return
+        now = time.time()
+        for title, entry in entries.items():
+            if not self._expired(entry, now):
+                self._entries[title] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        ttl = self.ttl_seconds if entry.get("found") else self.negative_ttl_seconds
+        return now - entry.get("fetched_at", 0) > ttl
+
+    def flush(self):
+        if not self.path:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self._entries)
+                self._dirty = False
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def get(self, title: str) -> Optional[Dict]:
+        """Cached entry for `title` (positive or negative), or None. No network."""
+        with self._lock:
+            entry = self._entries.get(title)
+            if entry is None or self._expired(entry, time.time()):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(title)
+            self.hits += 1
+            return entry
+
+    def put(self, title: str, summary: Dict):
+        """Store a `request_summary` result ({} for a missing page)."""
+        entry = {
+            "title": summary.get("title", title),
+            "extract": summary.get("extract", ""),
+            "found": bool(summary),
+            "fetched_at": time.time(),
+        }
+        with self._lock:
+            self._entries[title] = entry
+            self._entries.move_to_end(title)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return entry
+
+    def fetch(self, title: str, persist: bool = True) -> Optional[Dict]:
+        """Cached entry, or query Wikipedia on a miss. None if the request failed."""
+        entry = self.get(title)
+        if entry is not None:
+            return entry
+        self.requests += 1
+        summary = request_summary(title, timeout=self.timeout, session=self._session)
+        if summary is None:
+            return None
+        entry = self.put(title, summary)
+        if persist:
+            self.flush()
+        return entry
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "requests": self.requests,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_default_cache: Optional[SummaryCache] = None
+_default_lock = threading.Lock()
+
+
+def default_summary_cache() -> SummaryCache:
+    """Process-wide summary cache shared by `fetch_summary` and `data_fetcher`."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SummaryCache()
+        return _default_cache
+
+
+def fetch_summary(title: str, sentences: int = 2) -> str:
+    entry = default_summary_cache().fetch(title)
+    return entry["extract"] if entry else ""
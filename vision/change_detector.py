@@ -0,0 +1,105 @@
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+
+def dhash(frame: np.ndarray, hash_size: int = 8) -> np.ndarray:
+    """Difference hash of a BGR or grayscale frame as a flat bool array of hash_size**2 bits."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (small[:, 1:] > small[:, :-1]).ravel()
+
+
+def color_histogram(frame: np.ndarray, bins: int = 16) -> np.ndarray:
+    """Normalized hue/saturation histogram of a BGR frame (pass a thumbnail for speed)."""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [bins, bins], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).astype(np.float32)
+
+
+class FrameChangeGate:
+    """Cheap scene-change detector placed in front of `MatchEngine.match_frame`.
+
+    Each candidate frame is compared with the last frame that was actually
+    sent to inference, using a perceptual difference hash (structure) and a
+    hue/saturation histogram distance (color). If neither moved past its
+    threshold the previous match can be reused. Inference is forced anyway
+    once `max_stale_frames` candidates or `max_stale_seconds` have passed.
+
+    Usage:
+        gate = FrameChangeGate()
+        if gate.should_infer(frame):
+            match = engine.match_frame(frame)
+        print(gate.stats())
+    """
+
+    def __init__(
+        self,
+        hash_size: int = 8,
+        hash_threshold: int = 6,
+        hist_threshold: float = 0.2,
+        max_stale_frames: int = 30,
+        max_stale_seconds: float = 2.0,
+    ):
+        self.hash_size = hash_size
+        self.hash_threshold = hash_threshold
+        self.hist_threshold = hist_threshold
+        self.max_stale_frames = max_stale_frames
+        self.max_stale_seconds = max_stale_seconds
+
+        self._ref_hash: Optional[np.ndarray] = None
+        self._ref_hist: Optional[np.ndarray] = None
+        self._ref_time = 0.0
+        self._since_ref = 0
+
+        self.executed = 0
+        self.skipped = 0
+        self.forced = 0
+
+    def reset(self):
+        """Forget the reference frame so the next candidate is inferred."""
+        self._ref_hash = None
+        self._ref_hist = None
+
+    def should_infer(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """True if `frame` differs enough (or the last result is stale) to run inference.
+
+        A True answer makes `frame` the new reference.
+        """
+        now = time.time() if now is None else now
+        # both signatures come from one small thumbnail
+        thumb = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
+        h = dhash(thumb, self.hash_size)
+        hist = color_histogram(thumb)
+
+        if self._ref_hash is None:
+            run = True
+        else:
+            self._since_ref += 1
+            hamming = int(np.count_nonzero(h != self._ref_hash))
+            hist_dist = cv2.compareHist(self._ref_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+            run = hamming > self.hash_threshold or hist_dist > self.hist_threshold
+            if not run and (self._since_ref >= self.max_stale_frames
+                            or now - self._ref_time >= self.max_stale_seconds):
+                run = True
+                self.forced += 1
+
+        if run:
+            self._ref_hash, self._ref_hist = h, hist
+            self._ref_time = now
+            self._since_ref = 0
+            self.executed += 1
+        else:
+            self.skipped += 1
+        return run
+
+    def stats(self) -> Dict:
+        total = self.executed + self.skipped
+        return {
+            "executed": self.executed,
+            "skipped": self.skipped,
+            "forced": self.forced,
+            "skip_rate": self.skipped / total if total else 0.0,
+        }
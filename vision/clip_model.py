@@ -1,9 +1,44 @@
-from typing import List, Union
+from typing import List, Optional, Sequence, Tuple, Union
+import collections
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
-import open_clip
-import torch
+
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the image/text preprocessing changes in a way that alters the
+# produced embeddings, so persisted embedding caches are invalidated.
+# 2: reference images are decoded at reduced JPEG scale and batch-preprocessed
+PREPROCESS_VERSION = 2
+
+# Where exported image encoders are cached
+DEFAULT_EXPORT_DIR = "data/models"
+
+BACKENDS = ("open_clip", "open_clip_int8", "sentence_transformers")
+
+# Rough peak memory of one image going through the image tower (input,
+# activations, output) on CPU, used to size batches under a memory ceiling
+ENCODE_BYTES_PER_IMAGE = 4 << 20
+
+
+def load_image(path: str, min_size: int = 0) -> np.ndarray:
+    """Decode an image file to a BGR uint8 array.
+
+    JPEGs are decoded at the smallest DCT scale (1/2, 1/4, 1/8) that keeps
+    both sides at least `min_size` pixels, which is much faster and smaller
+    than decoding a full-size photo that is resized to 224 px anyway.
+    """
+    with Image.open(path) as img:
+        if min_size:
+            img.draft("RGB", (min_size, min_size))
+        rgb = np.asarray(img.convert("RGB"))
+    return rgb[..., ::-1]
 
 
 class ClipModel:
@@ -13,55 +48,344 @@ class ClipModel:
     Methods:
       - encode_images(list_of_paths_or_pil_or_ndarray) -> np.ndarray (N, D)
       - encode_texts(list_of_str) -> np.ndarray (N, D)
+
+    `model_name` and `pretrained` identify the loaded weights (used to key
+    persisted embeddings).
+
+    `backend` picks the implementation (default: open_clip, falling back to
+    sentence-transformers). "open_clip_int8" is a CPU backend whose image
+    tower has dynamically int8-quantized linear layers and is traced with
+    TorchScript; the export is cached under `export_dir` and reused on the
+    next start. Text encoding stays in float32. `threads` sets torch's
+    intra-op thread count (process-wide). Use `compare_backends` to measure
+    the embedding drift and speed-up before switching.
+
+    Reference image files go through `encode_image_files`, a streaming
+    pipeline: a thread pool decodes and resizes images while fixed-size
+    batches run through the model, under a memory ceiling, and unreadable
+    images do not abort the batch.
+
+    Nothing is imported or loaded at construction: torch/open_clip and the
+    weights are loaded on first use (any encode call or attribute access),
+    or ahead of time in a background thread with `warm_up()` so loading
+    overlaps with other start-up work.
+
+    Usage:
+        clip = ClipModel().warm_up()   # returns immediately
+        ...                            # e.g. query POIs meanwhile
+        emb = clip.encode_texts(["Eiffel Tower"])   # waits for the load if needed
     """
 
-    def __init__(self, device: str = "cpu"):
+    def __init__(self, device: str = "cpu", backend: Optional[str] = None, threads: Optional[int] = None,
+                 export_dir: str = DEFAULT_EXPORT_DIR):
+        if backend is not None and backend not in BACKENDS:
+            raise ValueError(f"Unknown CLIP backend {backend!r}, expected one of {BACKENDS}")
+        if backend == "open_clip_int8" and device != "cpu":
+            logger.warning("The int8 backend runs on CPU only, ignoring device %s", device)
+            device = "cpu"
         self.device = device
-        self.model = None
-        self.preprocess = None
-        self.backend = None
+        self.requested_backend = backend
+        self.threads = threads
+        self.export_dir = export_dir
+        self._model = None
+        self._preprocess = None
+        self._backend = None
+        self._model_name = None
+        self._pretrained = None
+        # PIL-free path for batches of OpenCV frames (open_clip backends)
+        self._batch_preprocess = None
+        # image tower: model.encode_image, or the exported int8 module
+        self._image_encoder = None
+
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+        self.load_seconds: Optional[float] = None
+        self.load_started: Optional[float] = None
+
+    # ------------------------------------------------------------- loading
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def warm_up(self) -> "ClipModel":
+        """Start loading in a daemon thread; returns immediately."""
+        if not self._loaded and self._warm_thread is None:
+            self._warm_thread = threading.Thread(target=self.load, name="clip-warm-up", daemon=True)
+            self._warm_thread.start()
+        return self
+
+    def load(self) -> "ClipModel":
+        """Load the model now (blocks until a warm-up in progress finishes)."""
+        if self._loaded:
+            return self
+        with self._load_lock:
+            if not self._loaded:
+                self.load_started = time.perf_counter()
+                self._load()
+                self.load_seconds = time.perf_counter() - self.load_started
+                self._loaded = True
+        return self
+
+    @property
+    def model(self):
+        return self.load()._model
 
+    @property
+    def preprocess(self):
+        return self.load()._preprocess
+
+    @property
+    def backend(self) -> Optional[str]:
+        return self.load()._backend
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.load()._model_name
+
+    @property
+    def pretrained(self) -> Optional[str]:
+        return self.load()._pretrained
+
+    @property
+    def batch_preprocess(self):
+        return self.load()._batch_preprocess
+
+    def _load(self):
+        device = self.device
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        if self.requested_backend == "sentence_transformers":
+            self._load_sentence_transformers()
+            return
         # Try open_clip
         try:
             import open_clip
             import torch
-            self.backend = "open_clip"
+            from vision.preprocess import OPENAI_MEAN, OPENAI_STD, BatchPreprocessor
+
+            self._backend = "open_clip"
             model, _, preprocess = open_clip.create_model_and_transforms("ViT-B-32", pretrained="openai")
             model.eval()
             if device != "cpu":
                 model.to(device)
-            self.model = model
-            self.preprocess = preprocess
-            print(f"Using OpenCLIP backend on device {device}")
+            self._model = model
+            self._preprocess = preprocess
+            self._model_name = "ViT-B-32"
+            self._pretrained = "openai"
+            cfg = getattr(model.visual, "preprocess_cfg", {}) or {}
+            self._batch_preprocess = BatchPreprocessor(
+                size=model.visual.image_size[0],
+                mean=cfg.get("mean", OPENAI_MEAN),
+                std=cfg.get("std", OPENAI_STD),
+            )
+            self._image_encoder = model.encode_image
+            if self.requested_backend == "open_clip_int8":
+                try:
+                    self._image_encoder = self._int8_image_encoder(model)
+                    self._backend = "open_clip_int8"
+                    # different embeddings: keep them apart in persisted caches
+                    self._pretrained = "openai-int8"
+                except Exception as e:
+                    logger.warning("int8 image encoder unavailable, using float32: %s", e)
+            logger.info("Using %s backend on device %s", self._backend, device)
         except Exception:
             # Fallback to sentence-transformers if available
+            self._load_sentence_transformers()
+
+    def _load_sentence_transformers(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+
+            # some installations provide a CLIP-like model name
+            self._backend = "sentence_transformers"
+            self._model = SentenceTransformer("clip-ViT-B-32")
+            self._model_name = "clip-ViT-B-32"
+            self._pretrained = "sentence-transformers"
+        except Exception:
+            self._backend = None
+
+    def _int8_image_encoder(self, model):
+        """Dynamically quantized, TorchScript-traced image tower, cached on disk."""
+        import warnings
+
+        import torch
+
+        tag = f"{self._model_name}-{self._pretrained}-int8-torch{torch.__version__}".replace("/", "_").replace("+", "_")
+        path = os.path.join(self.export_dir, tag + ".pt")
+        if os.path.exists(path):
             try:
-                from sentence_transformers import SentenceTransformer
+                return torch.jit.load(path, map_location="cpu")
+            except Exception as e:
+                logger.warning("Ignoring unreadable export %s: %s", path, e)
 
-                # some installations provide a CLIP-like model name
-                self.backend = "sentence_transformers"
-                self.model = SentenceTransformer("clip-ViT-B-32")
-            except Exception:
-                self.backend = None
+        size = model.visual.image_size[0]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            quantized = torch.ao.quantization.quantize_dynamic(model.visual, {torch.nn.Linear}, dtype=torch.qint8)
+            with torch.no_grad():
+                traced = torch.jit.freeze(torch.jit.trace(quantized, torch.zeros(1, 3, size, size)))
+        os.makedirs(self.export_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        torch.jit.save(traced, tmp)
+        os.replace(tmp, path)
+        logger.info("Exported int8 image encoder to %s", path)
+        return traced
+
+    @property
+    def _is_open_clip(self) -> bool:
+        return self.backend in ("open_clip", "open_clip_int8")
+
+    @staticmethod
+    def _all_bgr_frames(items) -> bool:
+        return bool(items) and all(
+            isinstance(it, np.ndarray) and it.dtype == np.uint8 and it.ndim == 3 and it.shape[2] == 3
+            for it in items
+        )
+
+    def _embedding_dim(self) -> int:
+        visual = getattr(self.model, "visual", None)
+        return int(getattr(visual, "output_dim", 512))
+
+    def encode_image_files(
+        self,
+        paths: Sequence[str],
+        batch_size: int = 32,
+        workers: int = 4,
+        max_memory_mb: Optional[float] = 512,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode image files as a stream of fixed-size batches.
+
+        Decoding (at reduced JPEG scale) and resize/crop run on `workers`
+        threads, ahead of the batch being encoded; embeddings are written
+        into one preallocated (N, D) float32 matrix. `max_memory_mb` caps the
+        working set (images in flight plus the batch in the model, see
+        ENCODE_BYTES_PER_IMAGE) by shrinking the batch and the read-ahead;
+        None disables the cap. Missing or corrupt images are logged and
+        skipped: their rows are NaN and `ok` is False for them.
+
+        Returns (embeddings, ok).
+        """
+        n = len(paths)
+        ok = np.zeros(n, dtype=bool)
+        out: Optional[np.ndarray] = None
+        batch_size = max(1, batch_size)
+        if max_memory_mb is not None:
+            # the batch in the model plus as many images again being prepared
+            batch_size = max(1, min(batch_size, int(max_memory_mb * (1 << 20)) // (2 * ENCODE_BYTES_PER_IMAGE)))
+        workers = max(1, min(workers, batch_size))
+        read_ahead = batch_size + workers
+
+        if self._is_open_clip and self.batch_preprocess is not None:
+            import torch
+            from vision.preprocess import BatchPreprocessor
+
+            shared = self.batch_preprocess
+            # private buffers: frame matching may use the shared one meanwhile
+            prep = BatchPreprocessor(shared.size, shared.mean, shared.std)
+            prep.reserve(batch_size)
+
+            def decode(path):
+                return prep.resize_crop(load_image(path, prep.size))
+
+            def add(slot, item):
+                prep.crops[slot].copy_(item)
+
+            def forward(count):
+                with instrument.span("preprocess"):
+                    batch = prep.normalize(count).to(self.device)
+                with instrument.span("clip_forward"), torch.no_grad():
+                    return self._image_encoder(batch).cpu().numpy()
+        else:
+            pending_images: List[Image.Image] = []
+
+            def decode(path):
+                return Image.open(path).convert("RGB")
+
+            def add(slot, item):
+                pending_images.append(item)
+
+            def forward(count):
+                emb = self.encode_images(pending_images)
+                pending_images.clear()
+                return emb
+
+        def prepare(i):
+            try:
+                with instrument.span("decode"):
+                    return decode(paths[i])
+            except Exception as e:
+                logger.warning("Skipping unreadable image %s: %s", paths[i], e)
+                instrument.count("encode.unreadable")
+                return None
+
+        rows: List[int] = []
+
+        def flush():
+            nonlocal out
+            if not rows:
+                return
+            emb = np.asarray(forward(len(rows)), dtype=np.float32)
+            if out is None:
+                out = np.full((n, emb.shape[1]), np.nan, dtype=np.float32)
+            out[rows] = emb
+            ok[rows] = True
+            rows.clear()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-decode") as pool:
+            queue = collections.deque()
+            next_i = 0
+            while next_i < n or queue:
+                # keep at most `read_ahead` images decoded or decoding
+                while next_i < n and len(queue) < read_ahead:
+                    queue.append((next_i, pool.submit(prepare, next_i)))
+                    next_i += 1
+                i, future = queue.popleft()
+                item = future.result()
+                if item is None:
+                    continue
+                add(len(rows), item)
+                rows.append(i)
+                if len(rows) == batch_size:
+                    flush()
+            flush()
+
+        if out is None:
+            out = np.full((n, self._embedding_dim()), np.nan, dtype=np.float32)
+        return out, ok
 
     def encode_images(self, items: List[Union[str, Image.Image, np.ndarray]]) -> np.ndarray:
-        imgs = []
+        """Embeddings of frames, PIL images or image paths (rows of unreadable paths are NaN)."""
+        if items and all(isinstance(it, str) for it in items):
+            return self.encode_image_files(items)[0]
+        if self._is_open_clip and self.batch_preprocess is not None and self._all_bgr_frames(items):
+            # OpenCV frames: batched resize/crop/normalize without PIL round-trips
+            import torch
+            with instrument.span("preprocess"):
+                batch = self.batch_preprocess(items).to(self.device)
+            with instrument.span("clip_forward"), torch.no_grad():
+                emb = self._image_encoder(batch)
+                emb = emb.cpu().numpy()
+            return emb
+
         pil_list = []
-        for it in items:
-            if isinstance(it, str):
-                pil = Image.open(it).convert("RGB")
-            elif isinstance(it, np.ndarray):
-                pil = Image.fromarray(it[..., ::-1]) if it.dtype == "uint8" else Image.fromarray(it)
-            else:
-                pil = it.convert("RGB")
-            pil_list.append(pil)
-        if self.backend == "open_clip":
+        with instrument.span("decode"):
+            for it in items:
+                if isinstance(it, str):
+                    pil = Image.open(it).convert("RGB")
+                elif isinstance(it, np.ndarray):
+                    pil = Image.fromarray(it[..., ::-1]) if it.dtype == "uint8" else Image.fromarray(it)
+                else:
+                    pil = it.convert("RGB")
+                pil_list.append(pil)
+        if self._is_open_clip:
             import torch
-            import open_clip
-            tensors = [self.preprocess(p) for p in pil_list]
-            batch = torch.stack(tensors).to(self.device)
-            with torch.no_grad():
-                emb = self.model.encode_image(batch)
+            with instrument.span("preprocess"):
+                tensors = [self.preprocess(p) for p in pil_list]
+                batch = torch.stack(tensors).to(self.device)
+            with instrument.span("clip_forward"), torch.no_grad():
+                emb = self._image_encoder(batch)
                 emb = emb.cpu().numpy()
             return emb
 
@@ -78,17 +402,84 @@ class ClipModel:
         # No model available: return zero vectors
         return np.zeros((len(pil_list), 512), dtype=float)
 
-    def encode_texts(self, texts: List[str]) -> np.ndarray:
-        if self.backend == "open_clip":
+    def encode_texts(self, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        if self._is_open_clip:
+            import open_clip
             import torch
-            tokenizer = open_clip.tokenize(texts).to(self.device)
-            with torch.no_grad():
-                emb = self.model.encode_text(tokenizer)
-                emb = emb.cpu().numpy()
-            return emb
+            out = np.empty((len(texts), self.model.text_projection.shape[1]), dtype=np.float32)
+            # fixed-size chunks keep activation memory flat for long lists
+            for start in range(0, len(texts), batch_size):
+                tokens = open_clip.tokenize(texts[start:start + batch_size]).to(self.device)
+                with instrument.span("clip_text_forward"), torch.no_grad():
+                    out[start:start + len(tokens)] = self.model.encode_text(tokens).cpu().numpy()
+            return out
         if self.backend == "sentence_transformers":
             return self.model.encode(texts, convert_to_numpy=True)
         # fallback
-        import numpy as np
-
         return np.zeros((len(texts), 512), dtype=float)
+
+
+def compare_backends(
+    images: List[np.ndarray],
+    candidate: str = "open_clip_int8",
+    reference: str = "open_clip",
+    threads: Optional[int] = None,
+    repeats: int = 3,
+    export_dir: str = DEFAULT_EXPORT_DIR,
+) -> dict:
+    """Embedding drift and latency of `candidate` against the float `reference` backend.
+
+    `images` is a fixed set of BGR frames. Returns the min/mean cosine
+    similarity between the two backends' embeddings of each image and the
+    best-of-`repeats` per-image latency of each.
+    """
+    models = {name: ClipModel(backend=name, threads=threads, export_dir=export_dir).load()
+              for name in (reference, candidate)}
+    embs, latency_ms = {}, {}
+    for name, model in models.items():
+        model.encode_images(images[:1])  # warm-up
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            emb = model.encode_images(images)
+            best = min(best, time.perf_counter() - t0)
+        embs[name] = emb / (np.linalg.norm(emb, axis=1, keepdims=True) + 1e-8)
+        latency_ms[name] = 1000.0 * best / len(images)
+    cos = np.sum(embs[reference] * embs[candidate], axis=1)
+    return {
+        "reference": models[reference].backend,
+        "candidate": models[candidate].backend,
+        "images": len(images),
+        "min_cosine": float(cos.min()),
+        "mean_cosine": float(cos.mean()),
+        "reference_ms_per_image": latency_ms[reference],
+        "candidate_ms_per_image": latency_ms[candidate],
+        "speedup": latency_ms[reference] / latency_ms[candidate],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    import cv2
+
+    parser = argparse.ArgumentParser(description="Accuracy/latency check of the int8 CLIP backend")
+    parser.add_argument("images", nargs="*", help="image files (default: data/references/*)")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--max-cosine-drop", type=float, default=0.02,
+                        help="fail if any image's cosine to the float model drops below 1 - this")
+    args = parser.parse_args()
+
+    paths = args.images or sorted(glob.glob("data/references/*"))[:32]
+    frames = [f for f in (cv2.imread(p) for p in paths) if f is not None]
+    if not frames:
+        # deterministic fallback set
+        rng = np.random.default_rng(0)
+        frames = [cv2.GaussianBlur(rng.integers(0, 256, (480, 640, 3), dtype=np.uint8), (0, 0), 3)
+                  for _ in range(16)]
+    report = compare_backends(frames, threads=args.threads)
+    for k, v in report.items():
+        print(f"{k:>24}: {v:.4f}" if isinstance(v, float) else f"{k:>24}: {v}")
+    if report["min_cosine"] < 1.0 - args.max_cosine_drop:
+        raise SystemExit(f"int8 drift too large: min cosine {report['min_cosine']:.4f}")
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils import instrument
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed store for CLIP embeddings.
+
+    Entries are namespaced by (model name, pretrained tag, preprocessing
+    version) and keyed by the SHA-256 of the encoded content (image bytes or
+    text). All vectors of a namespace live in a single memory-mapped
+    ``embeddings.npy`` slab, so hits are read straight from the page cache
+    without deserialisation. When the slab is full, the least recently used
+    rows are evicted and reused.
+
+    The cache has a single writer. Other processes sharing the directory
+    should open it with `read_only=True`: hits are served from the slab and
+    misses are encoded but not persisted.
+
+    Usage:
+        cache = EmbeddingCache("data/embeddings", "ViT-B-32", "openai", 1)
+        emb = cache.get_or_compute("text", texts, payloads, clip.encode_texts)
+        print(cache.stats())
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        model_name: str,
+        pretrained: str,
+        preprocess_version: int,
+        max_entries: int = 20000,
+        read_only: bool = False,
+    ):
+        namespace = f"{model_name}-{pretrained}-v{preprocess_version}".replace("/", "_")
+        self.root = os.path.join(cache_dir, namespace)
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._slab: Optional[np.ndarray] = None
+        # key -> [row, last_used]
+        self._index: Dict[str, List] = {}
+        self._free_rows: List[int] = []
+        self._load()
+
+    # ------------------------------------------------------------------ keys
+    @staticmethod
+    def content_key(kind: str, payload: bytes) -> str:
+        h = hashlib.sha256()
+        h.update(kind.encode("utf8"))
+        h.update(b"\0")
+        h.update(payload)
+        return h.hexdigest()
+
+    # --------------------------------------------------------------- storage
+    @property
+    def _slab_path(self) -> str:
+        return os.path.join(self.root, "embeddings.npy")
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+
+    def _load(self):
+        if not (os.path.exists(self._slab_path) and os.path.exists(self._index_path)):
+            return
+        try:
+            slab = np.load(self._slab_path, mmap_mode="r" if self.read_only else "r+")
+            with open(self._index_path, "r", encoding="utf8") as f:
+                index = json.load(f)
+        except Exception as e:
+            logger.warning("Embedding cache at %s is unreadable, starting empty: %s", self.root, e)
+            return
+        self._slab = slab
+        self._index = {k: list(v) for k, v in index.items() if v[0] < slab.shape[0]}
+        if len(self._index) > self.max_entries:
+            self._evict(len(self._index) - self.max_entries)
+        # a slab created with a larger bound keeps its size, but only
+        # max_entries rows are ever in use
+        used = {row for row, _ in self._index.values()}
+        free = [r for r in range(slab.shape[0] - 1, -1, -1) if r not in used]
+        self._free_rows = free[len(free) - (self.max_entries - len(self._index)):]
+
+    def _create_slab(self, dim: int):
+        os.makedirs(self.root, exist_ok=True)
+        self._slab = np.lib.format.open_memmap(
+            self._slab_path, mode="w+", dtype=np.float32, shape=(self.max_entries, dim)
+        )
+        self._index = {}
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+    def _evict(self, count: int):
+        victims = sorted(self._index.items(), key=lambda kv: kv[1][1])[:count]
+        for key, (row, _) in victims:
+            del self._index[key]
+            self._free_rows.append(row)
+        self.evictions += len(victims)
+
+    def flush(self):
+        """Flush the slab and atomically rewrite the index."""
+        with self._lock:
+            if self._slab is None or self.read_only:
+                return
+            self._slab.flush()
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf8") as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self._index_path)
+
+    # ---------------------------------------------------------------- access
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return a read-only view of the cached vector, or None on a miss.
+
+        The view aliases the memory-mapped slab: copy it if it must outlive a
+        later eviction.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry[1] = time.time()
+            self.hits += 1
+            row = self._slab[entry[0]]
+        row = row.view()
+        row.flags.writeable = False
+        return row
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        if self.read_only or not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._slab is None or self._slab.shape[1] != vectors.shape[1]:
+                self._create_slab(vectors.shape[1])
+            new_keys = {k for k in keys if k not in self._index}
+            shortfall = min(len(new_keys), self.max_entries) - len(self._free_rows)
+            if shortfall > 0:
+                self._evict(shortfall)
+            now = time.time()
+            for key, vec in zip(keys, vectors):
+                entry = self._index.get(key)
+                if entry is None:
+                    if not self._free_rows:
+                        self._evict(1)
+                    entry = [self._free_rows.pop(), now]
+                    self._index[key] = entry
+                entry[1] = now
+                self._slab[entry[0]] = vec
+        self.flush()
+
+    def get_or_compute(
+        self,
+        kind: str,
+        items: List,
+        payloads: Iterable[bytes],
+        encode_fn: Callable[[List], np.ndarray],
+    ) -> np.ndarray:
+        """Return embeddings for `items`, encoding only the cache misses.
+
+        `payloads` holds the raw content (text or image bytes) that identifies
+        each item; it may be a generator, so large files are hashed one at a
+        time instead of being held in memory together. `encode_fn` is called
+        once with the list of missed items. Rows it returns as NaN (items it
+        could not encode) are passed through but not cached.
+        """
+        keys = [self.content_key(kind, p) for p in payloads]
+        out: Optional[np.ndarray] = None
+        missing = []
+        for i, key in enumerate(keys):
+            vec = self.get(key)
+            if vec is None:
+                missing.append(i)
+                continue
+            if out is None:
+                out = np.empty((len(keys), vec.shape[0]), dtype=np.float32)
+            # copied right away: a later put may evict and reuse the slab row
+            out[i] = vec
+        instrument.count("embedding_cache.hit", len(keys) - len(missing))
+        instrument.count("embedding_cache.miss", len(missing))
+
+        if missing:
+            # de-duplicate identical content inside one request
+            first_for_key: Dict[str, int] = {}
+            for i in missing:
+                first_for_key.setdefault(keys[i], i)
+            todo = list(first_for_key.values())
+            encoded = np.asarray(encode_fn([items[i] for i in todo]), dtype=np.float32)
+            valid = np.isfinite(encoded).all(axis=1)
+            self.put_many([keys[i] for i, ok in zip(todo, valid) if ok], encoded[valid])
+            if out is None:
+                out = np.empty((len(keys), encoded.shape[1]), dtype=np.float32)
+            row_for_key = {keys[i]: j for j, i in enumerate(todo)}
+            out[missing] = encoded[[row_for_key[keys[i]] for i in missing]]
+
+        if out is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return out
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
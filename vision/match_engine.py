@@ -1,41 +1,236 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import logging
 import numpy as np
 import os
+import threading
 
-from vision.clip_model import ClipModel
-from geo.poi_images import fetch_and_cache_poi_image
+from vision.clip_model import ClipModel, PREPROCESS_VERSION
+from vision.embedding_cache import EmbeddingCache
+from vision.reference_index import make_index, top_k
 from geo.poi_retrieval import get_nearby_pois
-from geo_localization import haversine_distance
+from utils import instrument
+from utils.geoutils import GridIndex, angle_diff_deg, bearing_deg, poi_coordinates
+
+logger = logging.getLogger(__name__)
+
+
+def poi_key(poi: Dict) -> str:
+    """Stable identity of a POI: its Wikidata id, else name and position."""
+    qid = poi.get("tags", {}).get("wikidata")
+    if qid:
+        return qid
+    return f"{poi.get('name')}@{poi.get('lat')},{poi.get('lon')}"
+
+
+def _file_payloads(paths: List[str]):
+    """Contents of `paths`, read one at a time (a missing file yields a path-specific marker)."""
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                yield f.read()
+        except OSError:
+            yield b"missing:" + path.encode("utf8")
+
+
+DEFAULT_EMBEDDING_CACHE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "embeddings")
 
 
 class MatchEngine:
-    def __init__(self, device="cpu", alpha=0.9, max_radius_km=5.0):
-        self.clip = ClipModel(device=device)
+    """Match camera frames against CLIP embeddings of nearby POIs.
+
+    `index` selects the reference search backend: "exact" scores every
+    reference with one matmul; "ivf" uses an approximate inverted-file index
+    (see `vision.reference_index`) for tens of thousands of references, tuned
+    through `index_params` (n_lists, n_probe, ...). Processes that share the
+    embedding cache with a writer open it with `cache_read_only=True`.
+
+    With a camera heading (`heading`, or per call in `match_frames`, e.g.
+    from `utils.geoutils.HeadingEstimator`), only references inside the view
+    cone from `position` are scored: `fov_deg` wide plus `fov_margin_deg` on
+    each side for compass and GPS error, and references closer than
+    `view_near_m` regardless of bearing. Their reported "similarity" (and
+    the margin and ranking derived from it) is then the blended cosine minus
+    `distance_weight` times the distance as a fraction of `max_radius_km`,
+    so nearer monuments win close calls; the raw cosine is in "cosine".
+
+    Reference images are encoded by `ClipModel.encode_image_files`, tuned
+    through `encode_params` (batch_size, workers, max_memory_mb). POIs whose
+    image is missing or unreadable are left out of the reference set.
+
+    `clip_backend` and `threads` are passed to `ClipModel` (e.g.
+    "open_clip_int8" for faster CPU inference). The CLIP model is loaded on
+    first use; `warm_up=True` starts loading it in the background right
+    away, so callers can fetch POIs meanwhile.
+
+    POIs read from a region pack (`geo.region_pack`) bring their reference
+    embeddings: they are copied from the pack without any forward pass. The
+    pack must have been built with the same model; this is checked as soon
+    as the model is loaded.
+    """
+
+    def __init__(self, device="cpu", alpha=0.9, max_radius_km=5.0, cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE,
+                 index: str = "exact", index_params: Optional[Dict] = None, cache_read_only: bool = False,
+                 warm_up: bool = False, clip_backend: Optional[str] = None, threads: Optional[int] = None,
+                 encode_params: Optional[Dict] = None, fov_deg: float = 60.0, fov_margin_deg: float = 15.0,
+                 distance_weight: float = 0.05):
+        self.clip = ClipModel(device=device, backend=clip_backend, threads=threads)
+        if warm_up:
+            self.clip.warm_up()
         self.alpha = alpha
         self.beta = 1.0 - alpha
         self.max_radius_km = max_radius_km
+        self.encode_params = dict(encode_params or {})
+        # camera heading (degrees from north) enabling the view cone prefilter
+        self.heading: Optional[float] = None
+        self.fov_deg = fov_deg
+        self.fov_margin_deg = fov_margin_deg
+        self.distance_weight = distance_weight
+        self.view_near_m = 30.0
 
-        self.ref_image_embeddings = None
-        self.ref_text_embeddings = None
-        self.refs = []
+        # Reference set: refs[i] <-> row i of the embedding buffers. Buffers
+        # are over-allocated; only the first _count rows are live.
+        self.refs: List[Dict] = []
+        self.ref_index: Optional[GridIndex] = None
+        self.position: Optional[Tuple[float, float]] = None
+        self._keys: List[str] = []
+        self._txt: Optional[np.ndarray] = None
+        self._img: Optional[np.ndarray] = None
+        # pre-blended alpha * image + beta * text rows: since every vector is
+        # normalized, a single dot product gives the combined cosine score
+        self._comb: Optional[np.ndarray] = None
+        self._comb_weights = (alpha, 1.0 - alpha)
+        self._count = 0
+        # reusable scoring output, grown on demand
+        self._score_buf = np.zeros(0, dtype=np.float32)
+        # approximate backend, rebuilt lazily after the reference set changes
+        self.index_kind = index
+        self.vector_index = None if index == "exact" else make_index(index, **(index_params or {}))
+        self._vector_index_dirty = True
+        self._lock = threading.Lock()
+        # region packs whose model could not be checked yet (model still loading)
+        self._unverified_packs: Dict[str, object] = {}
 
-    def prepare_references(self, pois: List[Dict]):
-        # Filter POIs to only those with valid images
-        pois_with_images = [p for p in pois if p.get("image_path") is not None]
-        
-        if not pois_with_images:
-            print("Warning: No POIs with images found!")
-            self.ref_text_embeddings = None
-            self.ref_image_embeddings = None
-            self.refs = []
+        # Persistent embedding cache (disabled with cache_dir=None or without a
+        # model); opened on first access since it is keyed by the loaded model
+        self._cache_dir = cache_dir
+        self._cache_read_only = cache_read_only
+        self._cache: Optional[EmbeddingCache] = None
+        self._cache_opened = False
+        self._cache_lock = threading.Lock()
+
+    @property
+    def cache(self) -> Optional[EmbeddingCache]:
+        if not self._cache_opened:
+            with self._cache_lock:
+                if not self._cache_opened:
+                    if self._cache_dir and self.clip.backend is not None:
+                        self._cache = EmbeddingCache(
+                            self._cache_dir, self.clip.model_name, self.clip.pretrained, PREPROCESS_VERSION,
+                            read_only=self._cache_read_only,
+                        )
+                    self._cache_opened = True
+        return self._cache
+
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        if self.cache is None:
+            return self.clip.encode_texts(texts)
+        payloads = [t.encode("utf8") for t in texts]
+        return self.cache.get_or_compute("text", texts, payloads, self.clip.encode_texts)
+
+    def _encode_image_files(self, paths: List[str]) -> np.ndarray:
+        return self.clip.encode_image_files(paths, **self.encode_params)[0]
+
+    def _encode_images(self, paths: List[str]) -> np.ndarray:
+        """Embeddings of image files; rows of missing or unreadable files are NaN."""
+        if self.cache is None:
+            return self._encode_image_files(paths)
+        return self.cache.get_or_compute("image", paths, _file_payloads(paths), self._encode_image_files)
+
+    # ------------------------------------------------------------ reference set
+    @property
+    def ref_text_embeddings(self) -> Optional[np.ndarray]:
+        return self._txt[:self._count] if self._count else None
+
+    @property
+    def ref_image_embeddings(self) -> Optional[np.ndarray]:
+        return self._img[:self._count] if self._count else None
+
+    def _reserve(self, needed: int, dim: int):
+        """Grow the embedding buffers geometrically (like a vector) to hold `needed` rows.
+
+        Must be called with the lock held. A reallocation swaps in new arrays,
+        so views handed out earlier stay valid.
+        """
+        capacity = 0 if self._txt is None else self._txt.shape[0]
+        if self._txt is not None and needed <= capacity and self._txt.shape[1] == dim:
             return
-        
-        print(f"Processing {len(pois_with_images)} POIs with images (out of {len(pois)} total)")
-        
+        new_capacity = max(needed, 2 * capacity, 16)
+        txt = np.zeros((new_capacity, dim), dtype=np.float32)
+        img = np.zeros((new_capacity, dim), dtype=np.float32)
+        comb = np.zeros((new_capacity, dim), dtype=np.float32)
+        if self._count:
+            txt[:self._count] = self._txt[:self._count]
+            img[:self._count] = self._img[:self._count]
+            comb[:self._count] = self._comb[:self._count]
+        self._txt, self._img, self._comb = txt, img, comb
+
+    def _rebuild_index(self):
+        self.ref_index = GridIndex(*poi_coordinates(self.refs)) if self.refs else None
+        self._vector_index_dirty = True
+
+    def _verify_packs(self):
+        """Raise if a region pack's embeddings come from another model than the engine's."""
+        expected = (self.clip.model_name, self.clip.pretrained, PREPROCESS_VERSION)
+        for path, pack in list(self._unverified_packs.items()):
+            if tuple(pack.namespace) != expected:
+                raise ValueError(f"Region pack {path} was built with {pack.namespace}, the engine uses {expected}")
+            del self._unverified_packs[path]
+
+    def _pack_embeddings(self, pois: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalized (text, image) embeddings of region pack POIs, gathered per pack."""
+        groups: Dict[int, Tuple[object, List[int], List[int]]] = {}
+        for j, p in enumerate(pois):
+            pack, row = p["__pack"]
+            group = groups.setdefault(id(pack), (pack, [], []))
+            group[1].append(j)
+            group[2].append(row)
+        text_emb = image_emb = None
+        for pack, js, rows in groups.values():
+            if text_emb is None:
+                text_emb = np.empty((len(pois), pack.text_embeddings.shape[1]), dtype=np.float32)
+                image_emb = np.empty_like(text_emb)
+            text_emb[js] = pack.text_embeddings[rows]
+            image_emb[js] = pack.image_embeddings[rows]
+            self._unverified_packs[pack.path] = pack
+        if self.clip.loaded:
+            self._verify_packs()
+        # float16 storage: restore unit norm
+        text_emb /= np.linalg.norm(text_emb, axis=1, keepdims=True) + 1e-8
+        image_emb /= np.linalg.norm(image_emb, axis=1, keepdims=True) + 1e-8
+        return text_emb, image_emb
+
+    def _encode_pois(self, pois: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalized (text, image) embeddings of POIs with an `image_path` or a region pack row."""
+        packed = [j for j, p in enumerate(pois) if p.get("__pack") is not None]
+        if not packed:
+            return self._encode_references(pois)
+        if len(packed) == len(pois):
+            return self._pack_embeddings(pois)
+        fresh = [j for j, p in enumerate(pois) if p.get("__pack") is None]
+        pack_txt, pack_img = self._pack_embeddings([pois[j] for j in packed])
+        new_txt, new_img = self._encode_references([pois[j] for j in fresh])
+        text_emb = np.empty((len(pois), pack_txt.shape[1]), dtype=np.float32)
+        image_emb = np.empty_like(text_emb)
+        text_emb[packed], image_emb[packed] = pack_txt, pack_img
+        text_emb[fresh], image_emb[fresh] = new_txt, new_img
+        return text_emb, image_emb
+
+    def _encode_references(self, pois: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode POIs with an `image_path` (through the embedding cache)."""
         # Build text descriptions
         texts = []
         images = []
-        for p in pois_with_images:
+        for p in pois:
             name = p.get("name", "unknown place")
             tags = p.get("tags", {})
             poi_type = tags.get("historic") or tags.get("tourism") or "point of interest"
@@ -43,46 +238,286 @@ class MatchEngine:
             images.append(str(p["image_path"]))
 
         # Encode text and images
-        print(f"Encoding text for {len(texts)} POIs...")
-        text_emb = self.clip.encode_texts(texts)
-        
-        print(f"Encoding images for {len(images)} POIs...")
-        image_emb = self.clip.encode_images(images)
+        logger.info("Encoding text and images for %d POIs", len(texts))
+        text_emb = self._encode_texts(texts)
+        image_emb = self._encode_images(images)
+        if self.cache is not None:
+            logger.debug("Embedding cache: %s", self.cache.stats())
 
         # Normalize
         text_emb = text_emb / (np.linalg.norm(text_emb, axis=1, keepdims=True) + 1e-8)
         image_emb = image_emb / (np.linalg.norm(image_emb, axis=1, keepdims=True) + 1e-8)
-        
-        self.ref_text_embeddings = text_emb
-        self.ref_image_embeddings = image_emb
-        self.refs = pois_with_images
+        return text_emb.astype(np.float32), image_emb.astype(np.float32)
 
-    def match_frame(self, frame):
-        import torch
+    def _candidates(self, pois: List[Dict], position: Optional[Tuple[float, float]]) -> List[Dict]:
+        # Filter POIs to only those with valid images
+        candidates = [p for p in pois if p.get("image_path") is not None or p.get("__pack") is not None]
+
+        # and, when the camera position is known, to those within max_radius_km
+        if position is not None and candidates:
+            index = GridIndex(*poi_coordinates(candidates))
+            idx, _ = index.query_radius(position[0], position[1], self.max_radius_km * 1000.0)
+            candidates = [candidates[i] for i in sorted(idx.tolist())]
+        return candidates
+
+    def nearby_refs(self, lat: float, lon: float, radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices into `self.refs` within `radius_km` (default `max_radius_km`) and distances in meters."""
+        if self.ref_index is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        radius_km = self.max_radius_km if radius_km is None else radius_km
+        return self.ref_index.query_radius(lat, lon, radius_km * 1000.0)
+
+    def view_candidates(self, lat: float, lon: float, heading: float,
+                        fov_deg: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices into `self.refs` inside the view cone from (lat, lon) and their distances in meters."""
+        idx, dist = self.nearby_refs(lat, lon)
+        if len(idx) == 0:
+            return idx, dist
+        index = self.ref_index
+        bearings = bearing_deg(lat, lon, index.lats[idx], index.lons[idx])
+        half = (self.fov_deg if fov_deg is None else fov_deg) / 2.0 + self.fov_margin_deg
+        keep = (angle_diff_deg(bearings, heading) <= half) | (dist <= self.view_near_m)
+        return idx[keep], dist[keep]
+
+    def add_references(self, pois: List[Dict], position: Optional[Tuple[float, float]] = None) -> int:
+        """Add POIs to the reference set, encoding only those not already present.
+
+        POIs without an `image_path` or region pack row (or outside
+        `max_radius_km` of `position`) are skipped. Encoding runs without
+        holding the engine lock, so `match_frame` keeps working on the current
+        set meanwhile. Returns the number of references added.
+        """
+        with self._lock:
+            known = set(self._keys)
+        new, keys = [], []
+        for p in self._candidates(pois, position):
+            key = poi_key(p)
+            if key not in known:
+                known.add(key)
+                new.append(p)
+                keys.append(key)
+        if not new:
+            return 0
+
+        text_emb, image_emb = self._encode_pois(new)
+        valid = np.isfinite(image_emb).all(axis=1)
+        if not valid.all():
+            logger.warning("Dropping %d of %d references whose image could not be encoded",
+                           int((~valid).sum()), len(new))
+            new = [p for p, ok in zip(new, valid) if ok]
+            keys = [k for k, ok in zip(keys, valid) if ok]
+            text_emb, image_emb = text_emb[valid], image_emb[valid]
+            if not new:
+                return 0
+
+        with self._lock:
+            self._reserve(self._count + len(new), text_emb.shape[1])
+            start, end = self._count, self._count + len(new)
+            self._txt[start:end] = text_emb
+            self._img[start:end] = image_emb
+            alpha, beta = self._comb_weights
+            self._comb[start:end] = alpha * image_emb + beta * text_emb
+            # copy-on-write so lists handed out earlier are not mutated
+            self.refs = self.refs + new
+            self._keys = self._keys + keys
+            self._count = end
+            self._rebuild_index()
+        return len(new)
+
+    def remove_references(self, keys) -> int:
+        """Remove references by `poi_key`; returns the number removed.
+
+        Remaining rows are compacted in place and the buffers shrink when they
+        fall below a quarter of their capacity.
+        """
+        drop = set(keys)
+        with self._lock:
+            keep = [i for i, k in enumerate(self._keys) if k not in drop]
+            removed = self._count - len(keep)
+            if not removed:
+                return 0
+            n = len(keep)
+            self._txt[:n] = self._txt[keep]
+            self._img[:n] = self._img[keep]
+            self._comb[:n] = self._comb[keep]
+            self.refs = [self.refs[i] for i in keep]
+            self._keys = [self._keys[i] for i in keep]
+            self._count = n
+            capacity = self._txt.shape[0]
+            if capacity > 16 and n < capacity // 4:
+                new_capacity = max(16, capacity // 2)
+                self._txt = self._txt[:new_capacity].copy()
+                self._img = self._img[:new_capacity].copy()
+                self._comb = self._comb[:new_capacity].copy()
+            self._rebuild_index()
+        return removed
+
+    def recenter(self, lat: float, lon: float, pois: Optional[List[Dict]] = None) -> Dict:
+        """Move the reference set to a new camera position.
+
+        References farther than `max_radius_km` are evicted and POIs that
+        entered the radius are encoded and added. `pois` defaults to a fresh
+        `get_nearby_pois` query around the new position.
+        """
+        with self._lock:
+            inside = set(self.nearby_refs(lat, lon)[0].tolist())
+            leaving = [k for i, k in enumerate(self._keys) if i not in inside]
+        removed = self.remove_references(leaving)
+        if pois is None:
+            pois = get_nearby_pois(lat, lon, radius_km=self.max_radius_km)
+        added = self.add_references(pois, position=(lat, lon))
+        self.position = (lat, lon)
+        logger.info("Recentered on (%s, %s): +%d / -%d references, %d total", lat, lon, added, removed, len(self.refs))
+        return {"added": added, "removed": removed, "total": len(self.refs)}
+
+    def prepare_references(self, pois: List[Dict], position: Optional[Tuple[float, float]] = None):
+        """Make `pois` the reference set.
 
-        if self.ref_text_embeddings is None or len(self.refs) == 0:
+        References already loaded are kept without re-encoding; others are
+        removed. See `add_references` for the filtering rules.
+        """
+        candidates = self._candidates(pois, position)
+        if not candidates:
+            logger.warning("No POIs with images found")
+            self.remove_references(list(self._keys))
+            return
+
+        logger.info("Processing %d POIs with images (out of %d total)", len(candidates), len(pois))
+        wanted = {poi_key(p) for p in candidates}
+        self.remove_references([k for k in self._keys if k not in wanted])
+        self.add_references(candidates)
+        if position is not None:
+            self.position = tuple(position)
+
+    # ---------------------------------------------------------------- scoring
+    def _combined(self) -> np.ndarray:
+        """Live rows of the blended matrix, re-blended if alpha/beta changed. Lock held."""
+        weights = (self.alpha, self.beta)
+        if weights != self._comb_weights:
+            n = self._count
+            np.multiply(self._img[:n], self.alpha, out=self._comb[:n])
+            self._comb[:n] += self.beta * self._txt[:n]
+            self._comb_weights = weights
+            self._vector_index_dirty = True
+        return self._comb[:self._count]
+
+    @instrument.timed("similarity_scoring")
+    def score_embeddings(self, queries: np.ndarray, k: int = 1) -> Tuple[List[List[Dict]], np.ndarray]:
+        """Score a batch of image embeddings (B, D) against all references.
+
+        With the exact backend, one matmul against the blended reference matrix
+        gives the combined similarity of every pair and the best `k` per query
+        are selected with `argpartition`; the approximate backend only scores
+        the probed cells. Returns (per-query lists of {"poi", "similarity"} sorted
+        best first, margins between the best and second-best scores).
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-8)
+
+        with self._lock:
+            n, b = self._count, queries.shape[0]
+            if n == 0:
+                return [[] for _ in range(b)], np.zeros(b, dtype=np.float32)
+            refs = self.refs
+            kk = min(max(k, 2), n)
+            if self.vector_index is not None:
+                if self._vector_index_dirty:
+                    self.vector_index.build(self._combined())
+                    self._vector_index_dirty = False
+                top, top_scores = self.vector_index.search(queries, kk)
+            else:
+                if self._score_buf.size < b * n:
+                    self._score_buf = np.empty(max(b * n, 2 * self._score_buf.size), dtype=np.float32)
+                scores = self._score_buf[:b * n].reshape(b, n)
+                np.matmul(queries, self._combined().T, out=scores)
+                top, top_scores = top_k(scores, kk)
+
+        return self._ranked(refs, top, top_scores, k)
+
+    @staticmethod
+    def _ranked(refs: List[Dict], top: np.ndarray, top_scores: np.ndarray, k: int,
+                cosines: Optional[np.ndarray] = None,
+                distances: Optional[np.ndarray] = None) -> Tuple[List[List[Dict]], np.ndarray]:
+        """Per-query result lists and margins from `top_k` output over `refs`."""
+        margins = top_scores[:, 0] - top_scores[:, 1] if top.shape[1] > 1 else top_scores[:, 0].copy()
+        # no runner-up found (approximate backend): margin is the best score itself
+        margins = np.where(np.isfinite(margins), margins, top_scores[:, 0])
+        if cosines is None:
+            results = [
+                [{"poi": refs[i], "similarity": float(sc)} for i, sc in zip(row[:k], row_scores[:k]) if i >= 0]
+                for row, row_scores in zip(top.tolist(), top_scores.tolist())
+            ]
+            return results, margins
+        top_cosines = np.take_along_axis(cosines, top, axis=1)
+        results = [
+            [{"poi": refs[i], "similarity": float(sc), "cosine": float(cos), "distance_m": float(distances[i])}
+             for i, cos, sc in zip(row[:k], row_cosines[:k], row_scores[:k])]
+            for row, row_cosines, row_scores in zip(top.tolist(), top_cosines.tolist(), top_scores.tolist())
+        ]
+        return results, margins
+
+    @instrument.timed("similarity_scoring")
+    def score_view(self, queries: np.ndarray, rows: np.ndarray, refs: List[Dict], distances: np.ndarray,
+                   k: int = 1) -> Tuple[List[List[Dict]], np.ndarray]:
+        """Score image embeddings (B, D) against the blended `rows` of the references in view.
+
+        "similarity" is the distance-weighted score, which also gives the
+        ranking and the margin; results also carry the raw "cosine" and
+        "distance_m". Returns the same as `score_embeddings`.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-8)
+        cosines = queries @ rows.T
+        penalty = self.distance_weight * distances / (self.max_radius_km * 1000.0)
+        scores = cosines - penalty.astype(np.float32)
+        top, top_scores = top_k(scores, min(max(k, 2), len(refs)))
+        return self._ranked(refs, top, top_scores, k, cosines=cosines, distances=distances)
+
+    def _as_match(self, ranked: List[Dict], margin: float, k: int) -> Optional[Dict]:
+        if not ranked:
             return None
+        match = {"poi": ranked[0]["poi"], "similarity": ranked[0]["similarity"], "margin": float(margin)}
+        if "distance_m" in ranked[0]:
+            match["cosine"] = ranked[0]["cosine"]
+            match["distance_m"] = ranked[0]["distance_m"]
+        if k > 1:
+            match["top_k"] = ranked
+        return match
+
+    def match_frames(self, frames: List, k: int = 1, position: Optional[Tuple[float, float]] = None,
+                     heading: Optional[float] = None) -> List[Optional[Dict]]:
+        """Match a batch of frames with one encoder call and one scoring matmul.
+
+        `position` and `heading` default to the engine's; with both known only
+        the references in the view cone are scored (see the class docstring),
+        and when none is in view the frames are not even encoded.
+        """
+        if self._count == 0 or not frames:
+            return [None] * len(frames)
+        position = self.position if position is None else position
+        heading = self.heading if heading is None else heading
+        view = None
+        if position is not None and heading is not None:
+            with instrument.span("view_filter"), self._lock:
+                idx, dist = self.view_candidates(position[0], position[1], heading)
+                view = (self._combined()[idx], [self.refs[i] for i in idx.tolist()], dist)
+                instrument.count("view_filter.dropped", self._count - len(idx))
+            if len(idx) == 0:
+                return [None] * len(frames)
+        embs = self.clip.encode_images(list(frames))
+        if self._unverified_packs:
+            self._verify_packs()
+        if view is not None:
+            ranked, margins = self.score_view(embs, *view, k=k)
+        else:
+            ranked, margins = self.score_embeddings(embs, k=k)
+        return [self._as_match(r, m, k) for r, m in zip(ranked, margins)]
 
-        # Encode image ONCE
-        img_emb = self.clip.encode_images([frame])[0]
-        img_emb = img_emb / (np.linalg.norm(img_emb) + 1e-8)
-
-        # Convert to torch
-        img_t = torch.tensor(img_emb).unsqueeze(0)
-        ref_txt_t = torch.tensor(self.ref_text_embeddings)
-        ref_img_t = torch.tensor(self.ref_image_embeddings)
-
-        # Cosine similarity with all POIs
-        sims_txt = torch.nn.functional.cosine_similarity(img_t, ref_txt_t).tolist()
-        sims_image = torch.nn.functional.cosine_similarity(img_t, ref_img_t).tolist()
-        
-        # Combined similarity score
-        sims = [self.alpha * s_image + self.beta * s_text 
-                for s_text, s_image in zip(sims_txt, sims_image)]
-        
-        # Return best match
-        best_idx = int(np.argmax(sims))
-        return {
-            "poi": self.refs[best_idx],
-            "similarity": sims[best_idx]
-        }
\ No newline at end of file
+    def match_frame(self, frame, k: int = 1, position: Optional[Tuple[float, float]] = None,
+                    heading: Optional[float] = None) -> Optional[Dict]:
+        """Best reference for a frame: {"poi", "similarity", "margin"[, "top_k"]}."""
+        return self.match_frames([frame], k=k, position=position, heading=heading)[0]
@@ -0,0 +1,227 @@
+import json
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the `k` largest scores per row, best first."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k < n:
+        idx = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+    else:
+        idx = np.broadcast_to(np.arange(n), scores.shape)
+    vals = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-vals, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force inner-product index over normalized vectors (the reference backend)."""
+
+    kind = "exact"
+
+    def __init__(self):
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def build(self, vectors: np.ndarray) -> "ExactIndex":
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        return self
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, scores) of the `k` best rows per query, best first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self.vectors) == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        return top_k(queries @ self.vectors.T, k)
+
+    def save(self, path: str):
+        np.savez(path, kind=self.kind, vectors=self.vectors)
+
+    @classmethod
+    def load(cls, path: str) -> "ExactIndex":
+        data = np.load(path, allow_pickle=False)
+        return cls().build(data["vectors"])
+
+
+class IVFIndex:
+    """Inverted-file approximate index in pure NumPy.
+
+    Vectors are clustered with spherical k-means into `n_lists` cells and
+    stored contiguously per cell. A query is compared against the centroids
+    first and only the vectors of the `n_probe` closest cells are scored.
+
+    Knobs:
+      - n_lists: number of cells (default ~4*sqrt(N)); more cells = smaller scans
+      - n_probe: cells visited per query; higher = better recall, more latency
+      - train_size: max vectors used to train k-means (all are assigned)
+    """
+
+    kind = "ivf"
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, kmeans_iters: int = 15,
+                 train_size: int = 20_000, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.kmeans_iters = kmeans_iters
+        self.train_size = train_size
+        self.seed = seed
+
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)  # grouped by cell
+        self.ids = np.zeros(0, dtype=np.int64)  # original row of each stored vector
+        self.offsets = np.zeros(1, dtype=np.int64)  # cell c = vectors[offsets[c]:offsets[c+1]]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _assign(x: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        out = np.empty(len(x), dtype=np.int64)
+        for s in range(0, len(x), chunk):
+            out[s:s + chunk] = np.argmax(x[s:s + chunk] @ centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, x: np.ndarray, n_lists: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        if len(x) > self.train_size:
+            x = x[rng.choice(len(x), self.train_size, replace=False)]
+        centroids = x[rng.choice(len(x), n_lists, replace=False)].copy()
+        for _ in range(self.kmeans_iters):
+            assign = self._assign(x, centroids)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            # per-cell sums: sort by cell, then one reduceat over the runs
+            order = np.argsort(assign, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(x[order], starts[~empty], axis=0)
+            if empty.any():
+                # re-seed empty cells on random training points
+                sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-8)
+        return centroids.astype(np.float32)
+
+    def build(self, vectors: np.ndarray) -> "IVFIndex":
+        x = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(x)
+        if n == 0:
+            return self
+        n_lists = self.n_lists or int(round(4 * math.sqrt(n)))
+        n_lists = max(1, min(n_lists, n))
+        self.centroids = self._kmeans(x, n_lists)
+        assign = self._assign(x, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.ids = order.astype(np.int64)
+        self.vectors = np.ascontiguousarray(x[order])
+        self.offsets = np.searchsorted(assign[order], np.arange(n_lists + 1)).astype(np.int64)
+        return self
+
+    def search(self, queries: np.ndarray, k: int, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, scores) of the best `k` rows found per query, best first.
+
+        Rows are padded with -1 / -inf when the probed cells hold fewer than `k` vectors.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        b = len(queries)
+        out_idx = np.full((b, k), -1, dtype=np.int64)
+        out_val = np.full((b, k), -np.inf, dtype=np.float32)
+        if len(self.ids) == 0:
+            return out_idx, out_val
+
+        n_lists = len(self.centroids)
+        n_probe = max(1, min(n_probe or self.n_probe, n_lists))
+        cells, _ = top_k(queries @ self.centroids.T, n_probe)
+        for qi in range(b):
+            q = queries[qi]
+            ids, scores = [], []
+            for c in cells[qi]:
+                s, e = self.offsets[c], self.offsets[c + 1]
+                if e > s:
+                    ids.append(self.ids[s:e])
+                    scores.append(self.vectors[s:e] @ q)
+            if not ids:
+                continue
+            ids = np.concatenate(ids)
+            scores = np.concatenate(scores)
+            best, vals = top_k(scores[None, :], k)
+            m = best.shape[1]
+            out_idx[qi, :m] = ids[best[0]]
+            out_val[qi, :m] = vals[0]
+        return out_idx, out_val
+
+    def save(self, path: str):
+        meta = {"n_lists": self.n_lists, "n_probe": self.n_probe, "kmeans_iters": self.kmeans_iters,
+                "train_size": self.train_size, "seed": self.seed}
+        np.savez(path, kind=self.kind, meta=json.dumps(meta), centroids=self.centroids,
+                 vectors=self.vectors, ids=self.ids, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path, allow_pickle=False)
+        index = cls(**json.loads(str(data["meta"])))
+        index.centroids = data["centroids"]
+        index.vectors = data["vectors"]
+        index.ids = data["ids"]
+        index.offsets = data["offsets"]
+        return index
+
+
+INDEX_BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def make_index(kind: str = "exact", **kwargs):
+    if kind not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown reference index backend: {kind!r}")
+    return INDEX_BACKENDS[kind](**kwargs)
+
+
+def load_index(path: str):
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+    return INDEX_BACKENDS[kind].load(path)
+
+
+def recall_report(vectors: np.ndarray, queries: np.ndarray, k: int = 10,
+                  n_probes: Sequence[int] = (1, 2, 4, 8, 16, 32), ivf: Optional[IVFIndex] = None) -> List[Dict]:
+    """Recall@k and per-query latency of the IVF backend against the exact one.
+
+    Returns one row per n_probe, plus an "exact" baseline row.
+    """
+    exact = ExactIndex().build(vectors)
+    ivf = ivf if ivf is not None else IVFIndex().build(vectors)
+
+    t0 = time.perf_counter()
+    truth, _ = exact.search(queries, k)
+    exact_ms = (time.perf_counter() - t0) * 1e3 / len(queries)
+    rows = [{"backend": "exact", "n_probe": None, "recall": 1.0, "ms_per_query": exact_ms}]
+
+    for n_probe in n_probes:
+        t0 = time.perf_counter()
+        found, _ = ivf.search(queries, k, n_probe=n_probe)
+        ms = (time.perf_counter() - t0) * 1e3 / len(queries)
+        hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+        rows.append({"backend": "ivf", "n_probe": n_probe, "recall": hits / truth.size, "ms_per_query": ms})
+    return rows
+
+
+if __name__ == "__main__":
+    # synthetic clustered embeddings, roughly city scale
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((500, 512)).astype(np.float32)
+    data = centers[rng.integers(0, 500, 50_000)] + 0.6 * rng.standard_normal((50_000, 512)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    qs = data[rng.choice(len(data), 200, replace=False)] + 0.3 * rng.standard_normal((200, 512)).astype(np.float32)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+
+    t = time.perf_counter()
+    index = IVFIndex().build(data)
+    print(f"IVF build: {len(index.centroids)} lists in {time.perf_counter() - t:.1f}s")
+    for row in recall_report(data, qs, k=10, ivf=index):
+        print(row)
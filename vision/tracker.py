@@ -0,0 +1,221 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCHING = "searching"
+TRACKING = "tracking"
+
+BBox = Tuple[int, int, int, int]
+
+
+class TemplateTracker:
+    """Minimal OpenCV-style tracker (init/update) based on template matching.
+
+    The patch captured at `init` is searched by normalized cross-correlation
+    in a window around the previous position, on a downscaled grayscale
+    image. No scale or appearance adaptation, but it costs about a
+    millisecond per frame, so it is the fallback when the contrib trackers
+    are not installed.
+    """
+
+    def __init__(self, search_margin: float = 0.5, max_template_side: int = 96, min_score: float = 0.3):
+        self.search_margin = search_margin
+        self.max_template_side = max_template_side
+        self.min_score = min_score
+        self._template = None
+        self._bbox = None
+        self._scale = 1.0
+
+    def _gray(self, frame: np.ndarray) -> np.ndarray:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+
+    def init(self, frame: np.ndarray, bbox: BBox):
+        x, y, w, h = bbox
+        self._scale = min(1.0, self.max_template_side / max(w, h))
+        small = self._gray(frame)
+        sx, sy = int(x * self._scale), int(y * self._scale)
+        sw, sh = max(4, int(w * self._scale)), max(4, int(h * self._scale))
+        self._template = small[sy:sy + sh, sx:sx + sw].copy()
+        self._bbox = (x, y, w, h)
+
+    def update(self, frame: np.ndarray):
+        x, y, w, h = self._bbox
+        H, W = frame.shape[:2]
+        # only the search window around the last position is converted and scaled
+        mx, my = int(w * self.search_margin) + 1, int(h * self.search_margin) + 1
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(W, x + w + mx), min(H, y + h + my)
+        window = self._gray(frame[y0:y1, x0:x1])
+        th, tw = self._template.shape[:2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return False, self._bbox
+        res = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(res)
+        if score < self.min_score:
+            return False, self._bbox
+        self._bbox = (x0 + int(round(loc[0] / self._scale)), y0 + int(round(loc[1] / self._scale)), w, h)
+        return True, self._bbox
+
+
+_missing_trackers = set()
+
+
+def create_tracker(kind: str = "KCF"):
+    """Create a tracker by name: KCF, CSRT, MOSSE, MIL or TEMPLATE.
+
+    KCF/CSRT/MOSSE ship with opencv-contrib-python (MOSSE only under
+    `cv2.legacy`); when the requested one is missing, fall back to the
+    built-in `TemplateTracker`.
+    """
+    kind = kind.upper()
+    if kind != "TEMPLATE":
+        for module in (cv2, getattr(cv2, "legacy", None)):
+            factory = getattr(module, f"Tracker{kind}_create", None) if module is not None else None
+            if factory is not None:
+                return factory()
+        if kind not in _missing_trackers:
+            _missing_trackers.add(kind)
+            logger.warning("Tracker %s not available in this OpenCV build, falling back to template matching", kind)
+    return TemplateTracker()
+
+
+class TrackingStage:
+    """Detect-then-track state machine in front of the match engine.
+
+    States:
+      - "searching": no target; frames should go to CLIP matching
+      - "tracking": a confident match locked an OpenCV tracker on the matched
+        region; the tracker follows it every frame and no matching is needed
+
+    CLIP scores whole frames, so the matched region is the central
+    `roi_fraction` of the frame the match is applied to. Tracking confidence
+    is the normalized cross-correlation between the patch captured at lock
+    time and the currently tracked patch. The stage goes back to searching
+    when the tracker fails, the confidence drops below `min_confidence`, or
+    after `max_track_frames` frames (periodic re-verification).
+
+    Usage:
+        stage = TrackingStage()
+        state = stage.update(frame)
+        if state["needs_match"]:
+            match = engine.match_frame(frame)
+            stage.lock(frame, match)
+    """
+
+    def __init__(
+        self,
+        tracker_type: str = "KCF",
+        min_similarity: float = 0.5,
+        min_confidence: float = 0.4,
+        roi_fraction: float = 0.5,
+        max_track_frames: int = 300,
+        template_size: Tuple[int, int] = (48, 48),
+    ):
+        self.tracker_type = tracker_type
+        self.min_similarity = min_similarity
+        self.min_confidence = min_confidence
+        self.roi_fraction = roi_fraction
+        self.max_track_frames = max_track_frames
+        self.template_size = template_size
+
+        self.state = SEARCHING
+        self.match: Optional[Dict] = None
+        self.bbox: Optional[BBox] = None
+        self.confidence = 0.0
+        self._tracker = None
+        self._template: Optional[np.ndarray] = None
+        self._tracked_frames = 0
+
+        self.frames_tracked = 0
+        self.frames_searching = 0
+        self.locks = 0
+        self.losses = 0
+
+    def _patch(self, frame: np.ndarray, bbox: BBox) -> Optional[np.ndarray]:
+        x, y, w, h = bbox
+        H, W = frame.shape[:2]
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(W, x + w), min(H, y + h)
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return None
+        gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, self.template_size, interpolation=cv2.INTER_AREA)
+
+    def _central_roi(self, frame: np.ndarray) -> BBox:
+        H, W = frame.shape[:2]
+        w, h = int(W * self.roi_fraction), int(H * self.roi_fraction)
+        return ((W - w) // 2, (H - h) // 2, w, h)
+
+    def lock(self, frame: np.ndarray, match: Optional[Dict], bbox: Optional[BBox] = None) -> bool:
+        """Start tracking `match` if it is confident enough. Returns True if locked."""
+        if not match or match.get("similarity", 0) < self.min_similarity:
+            return False
+        bbox = bbox or self._central_roi(frame)
+        template = self._patch(frame, bbox)
+        if template is None:
+            return False
+        self._tracker = create_tracker(self.tracker_type)
+        self._tracker.init(frame, tuple(int(v) for v in bbox))
+        self._template = template
+        self._tracked_frames = 0
+        self.state = TRACKING
+        self.match = match
+        self.bbox = tuple(int(v) for v in bbox)
+        self.confidence = 1.0
+        self.locks += 1
+        return True
+
+    def release(self):
+        """Drop the target and go back to searching."""
+        if self.state == TRACKING:
+            self.losses += 1
+        self.state = SEARCHING
+        self._tracker = None
+        self._template = None
+        self.bbox = None
+        self.confidence = 0.0
+
+    def update(self, frame: np.ndarray) -> Dict:
+        """Advance the tracker on `frame`.
+
+        Returns {"state", "bbox", "confidence", "match", "needs_match"}; the
+        last match is kept while searching so the overlay can still show it.
+        """
+        if self.state == TRACKING:
+            ok, bbox = self._tracker.update(frame)
+            self._tracked_frames += 1
+            patch = self._patch(frame, tuple(int(v) for v in bbox)) if ok else None
+            if patch is not None:
+                ncc = cv2.matchTemplate(patch, self._template, cv2.TM_CCOEFF_NORMED)
+                self.confidence = float(ncc[0, 0])
+                self.bbox = tuple(int(v) for v in bbox)
+            else:
+                self.confidence = 0.0
+            if self.confidence < self.min_confidence or self._tracked_frames >= self.max_track_frames:
+                self.release()
+
+        if self.state == TRACKING:
+            self.frames_tracked += 1
+        else:
+            self.frames_searching += 1
+        return {
+            "state": self.state,
+            "bbox": self.bbox,
+            "confidence": self.confidence,
+            "match": self.match,
+            "needs_match": self.state == SEARCHING,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "frames_tracked": self.frames_tracked,
+            "frames_searching": self.frames_searching,
+            "locks": self.locks,
+            "losses": self.losses,
+        }